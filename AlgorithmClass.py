@@ -1,14 +1,19 @@
 from typing import List
 import numpy as np
 from pipeline.get_embedding import get_dense_embeddings
+from pipeline.quantize import VECTOR_DTYPE
 # from sklearn.metrics.pairwise import cosine_similarity
 
 # --------------------------
 # Helper functions
 # --------------------------
-from mapping import MappingOutput
+from mapping import FINAL_LAMBDA, CandidatePool, blend_vectors
+from mmr import MMREngine
 import json
 
+# bobot relevansi ke user di MMR saat memilih resep berikutnya
+MMR_LAMBDA = 0.99
+
 
 class AlgorithmClass:
 
@@ -18,14 +23,18 @@ class AlgorithmClass:
         self.top_k = 10
         self.selected = []
         self.user_pref = None
-        self.candidates = []
+        self.candidates = None
         self.current_recipe = None
         self.current_item_embeddding = None
+        self.engine = None
+        # dtype matrix pool kandidat (float32 / float16 / int8)
+        self.vector_dtype = VECTOR_DTYPE
 
     def reset(self):
         self.selected = []
         self.user_pref = None
-        self.candidates = []
+        self.candidates = None
+        self.engine = None
 
     def generate_recipe_embeddings(self, recipes: List[dict]):
         ''' Digunakan untuk generate embedding dari list of recipes'''
@@ -33,8 +42,9 @@ class AlgorithmClass:
         embeding_ingredients = []
         for recipe in recipes:
             if (('vector_all' in recipe) and ('values' in recipe)):
-                embeddings_all.append(recipe['vector_all'] or [])
-                embeding_ingredients.append(recipe['values'] or [])
+                # vector bisa berupa numpy row (hasil fetch_matrix), jangan pakai `or`
+                embeddings_all.append(recipe['vector_all'] if recipe['vector_all'] is not None else [])
+                embeding_ingredients.append(recipe['values'] if recipe['values'] is not None else [])
         return embeddings_all, embeding_ingredients
 
     def generate_input_embedding(self, text_input: str):
@@ -47,31 +57,50 @@ class AlgorithmClass:
         self.user_pref = embedding_input
         return text_input, embedding_input
 
-    def mapping_output(self, recipes, embeddings=None, embeding_ingredients=None) -> List[MappingOutput]:
+    def _build_pool(self, recipes, embeddings=None, embeding_ingredients=None) -> CandidatePool:
+        if any('final_vector' in r for r in recipes):
+            # final vector sudah di-blend saat ingestion (NAMESPACE_FINAL); yang belum ada
+            # (final namespace belum di-build) di-blend dari vector bahan + all-text kalau ada.
+            # Hasil hydrate final tidak bawa vector_all, jadi embeddings (kosong) diabaikan
+            return CandidatePool.from_final_vectors(
+                recipes, [self._final_vector(r) for r in recipes], dtype=self.vector_dtype,
+                dim=len(self.user_pref) if self.user_pref is not None else 0)
         if embeddings is None or embeding_ingredients is None:
             embeddings, embeding_ingredients = self.generate_recipe_embeddings(
                 recipes)
-
-        mapping_result = [
-            MappingOutput(title=recipe['title'],
-                          image=recipe.get('image', None),
-                          ingredients=recipe.get('ingredients', None),
-                          steps=recipe.get('steps', None),
-                          ingredients_vector=embeding_ingredients[i],
-                          all_vector=embeddings[i],
-                          final_vector=self.rerank_ingredients(
-                              embeddings[i], embeding_ingredients[i], lambd=0.5)
-                          )
-            for i, recipe in enumerate(recipes)
-        ]
-        self.candidates = mapping_result.copy()
-        return mapping_result
+        return CandidatePool.from_recipes(
+            recipes, embeddings, embeding_ingredients,
+            blend=lambda e_all, e_ing: self.rerank_ingredients(e_all, e_ing, lambd=FINAL_LAMBDA),
+            dtype=self.vector_dtype)
+
+    def mapping_output(self, recipes, embeddings=None, embeding_ingredients=None) -> CandidatePool:
+        pool = self._build_pool(recipes, embeddings, embeding_ingredients)
+        self.candidates = pool
+        self.selected = []
+        self.engine = MMREngine(pool.final_vectors, alive=pool.alive) if len(pool) else None
+        return pool
+
+    def first_pick(self, recipes):
+        """Index resep yang akan dipilih first_generate_recipe() untuk `recipes`
+        (pick MMR pertama dengan user_pref sekarang), None kalau tidak ada.
+        Cukup vector kandidat, metadata resep belum dibutuhkan."""
+        pool = self._build_pool(recipes)
+        if not len(pool):
+            return None
+        return MMREngine(pool.final_vectors).select(self.user_pref, MMR_LAMBDA)
 
     def get_recipe(self):
         return self.current_recipe
 
-    def first_generate_recipe(self):
-        return self.rating_recipe(rating=0)
+    def first_generate_recipe(self, index=None):
+        """Resep pertama. `index` diisi kalau resep pertama sudah ditentukan
+        (dan ditampilkan) sebelum pool kandidat selesai di-hydrate."""
+        if index is None:
+            return self.rating_recipe(rating=0)
+        picked = self.candidates[self.engine.take(index)]
+        self.selected.append(picked)
+        self._set_current(picked)
+        return self.current_recipe
 
     def rating_recipe(self, rating):
         """Update preferensi user berdasarkan rating (0-1)."""
@@ -79,11 +108,15 @@ class AlgorithmClass:
         self.user_pref = self.update_user_pref(
             self.user_pref, self.current_item_embeddding, rating, lr=0.1)
 
-        if self.candidates == []:
-            self.candidates = self.selected.copy()
+        if self.engine is not None and not self.candidates.n_alive:
+            self.engine.recycle()
             self.selected = []
 
-        reranked = self.mmr_rerank(lambd=0.99, top_k=1)[0]
+        reranked = self.mmr_rerank(lambd=MMR_LAMBDA, top_k=1)[0]
+        self._set_current(reranked)
+        return self.current_recipe
+
+    def _set_current(self, reranked):
         # curently selected item
         self.current_item_embeddding = reranked.final_vector
         self.current_recipe = {
@@ -107,33 +140,22 @@ class AlgorithmClass:
     def mmr_rerank(self, lambd=0.7, top_k=1):
         """Maximal Marginal Relevance Reranking."""
         bests = []
-        while len(bests) < top_k and self.candidates:
-            scores = []
-            for candidate in self.candidates:
-                sim_to_user = self.cosine_similarity(
-                    self.user_pref, candidate.final_vector)
-                sim_to_selected = max([self.cosine_similarity(
-                    candidate.final_vector, s.final_vector) for s in self.selected], default=0)
-                score = lambd * sim_to_user - (1 - lambd) * sim_to_selected
-                scores.append((score, candidate))
-            scores.sort(key=lambda x: x[0], reverse=True)
-            best = scores[0][1]
+        while len(bests) < top_k and self.engine is not None and self.candidates.n_alive:
+            best = self.candidates[self.engine.select(self.user_pref, lambd)]
             self.selected.append(best)
             bests.append(best)
-            self.candidates.remove(best)
         return bests
 
-    def rerank_ingredients(self, embed_all, embed_ingredients, lambd=0.7):
-        if not (0.0 <= lambd <= 1.0):
-            raise ValueError("lambd must be in [0, 1]")
-
-        e1 = np.asarray(embed_ingredients, dtype=np.float32)
-        e2 = np.asarray(embed_all, dtype=np.float32)
-        if e1.shape != e2.shape:
-            raise ValueError(f"Shape mismatch: {e1.shape} vs {e2.shape}")
+    def _final_vector(self, recipe):
+        if recipe.get('final_vector') is not None:
+            return recipe['final_vector']
+        if recipe.get('vector_all') is not None and recipe.get('values') is not None:
+            return self.rerank_ingredients(recipe['vector_all'], recipe['values'], lambd=FINAL_LAMBDA)
+        return None
 
-        out = lambd * e1 + (1.0 - lambd) * e2
-        return out
+    def rerank_ingredients(self, embed_all, embed_ingredients, lambd=0.7):
+        # sama persis dengan final vector yang dihitung saat ingestion
+        return blend_vectors(embed_ingredients, embed_all, lambd)
 
     def matching_algorithm(self, list_rag) -> List[str]:
         # Dummy implementation of the matching algorithm
@@ -1,19 +1,69 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Query
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import asyncio
+import numpy as np
 
-from pipeline.rag_pipeline import RAG_pipeline_async
+from pipeline.rag_pipeline import RAG_pipeline_async, RAG_pipeline_batch_async
+from pipeline.resources import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # koneksi Pinecone, BM25, dan client embedding dibuat sebelum request pertama;
+    # resource yang gagal tetap dicoba lagi saat request pertama
+    timings = await asyncio.to_thread(warm_up)
+    print("warm up:", {name: f"{sec:.2f}s" if isinstance(sec, float) else "failed"
+                       for name, sec in timings.items()})
+    yield
+
+
+app = FastAPI(title="Simple RAG Retriever", lifespan=lifespan)
+
+
+def to_jsonable(obj):
+    """Vector hasil pipeline berupa numpy array/float, ubah ke tipe JSON biasa."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(v) for v in obj]
+    return obj
 
-app = FastAPI(title="Simple RAG Retriever")
 
 @app.get("/retrieve", summary="Retrieve RAG results")
-async def retrieve_rag(query: str = Query(..., description="Your search query")):
+async def retrieve_rag(query: str = Query(..., description="Your search query"),
+                       mode: str = Query(None, description="sparse | dense | hybrid | weighted")):
     try:
-        results = await RAG_pipeline_async(query)
-        return {"query": query, "results": results}
+        results = await RAG_pipeline_async(query, mode=mode)
+        return {"query": query, "results": to_jsonable(results)}
     except Exception as e:
         return {"error": str(e)}
 
+class BatchRetrieveRequest(BaseModel):
+    queries: List[str] = Field(..., description="List of search queries")
+    mode: Optional[str] = Field(None, description="sparse | dense | hybrid | weighted")
+
+
+@app.post("/retrieve/batch", summary="Retrieve RAG results for many queries")
+async def retrieve_rag_batch(request: BatchRetrieveRequest):
+    try:
+        outputs = await RAG_pipeline_batch_async(request.queries, mode=request.mode)
+    except Exception as e:
+        return {"error": str(e)}
+
+    results = []
+    for query, (res, error) in zip(request.queries, outputs):
+        if error is not None:
+            results.append({"query": query, "error": str(error)})
+        else:
+            results.append({"query": query, "results": to_jsonable(res)})
+    return {"results": results}
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
\ No newline at end of file
@@ -0,0 +1,181 @@
+# benchmarks/fixtures.py
+"""Fixture offline untuk benchmark: resep, BM25 params, local vector index, dan
+embedding query yang sudah direkam, jadi benchmark tidak butuh Pinecone
+maupun API embedding.
+
+    # embedding asli dari provider (butuh SILICONFLOW_*), sekali saja
+    python benchmarks/fixtures.py record --recipes data/clean --queries queries.txt --out benchmarks/fixture
+
+    # tanpa credential: embedding tiruan (random projection bag-of-words)
+    python benchmarks/fixtures.py synthetic --recipes data/raw/cookpad_recipe_ayam.json --out benchmarks/fixture
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pinecone_text.sparse import BM25Encoder  # noqa: E402
+
+from pipeline.bm25_model import load_bm25_encoder  # noqa: E402
+from mapping import FINAL_LAMBDA, blend_vectors  # noqa: E402
+from pipeline.ingest import batched, final_namespace  # noqa: E402
+from pipeline.recipe_store import iter_recipes  # noqa: E402
+from pipeline.vector_index import LocalVectorIndex, coarse_namespace, truncate_vectors  # noqa: E402
+
+NAMESPACE = "ingredients"
+NAMESPACE2 = "all"
+NAMESPACE_FINAL = final_namespace(FINAL_LAMBDA)
+
+
+def _as_list(value):
+    # data/raw menyimpan list sebagai string repr
+    if isinstance(value, str):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return [value]
+    return value or []
+
+
+def normalize_recipe(raw: dict) -> dict:
+    """Resep mentah (data/raw) atau bersih (data/clean) -> field yang dipakai pipeline."""
+    ingredients = _as_list(raw.get("ingredients"))
+    steps = _as_list(raw.get("steps"))
+    text = raw.get("text") or ", ".join(ingredients)
+    step_text = " ".join(s.get("text", "") if isinstance(s, dict) else str(s) for s in steps)
+    return {
+        "id": raw.get("id") or hashlib.sha1((raw.get("url") or raw.get("title") or text).encode()).hexdigest()[:16],
+        "url": raw.get("url"),
+        "title": raw.get("title"),
+        "image": raw.get("image"),
+        "ingredients": ingredients,
+        "steps": steps,
+        "text": text,
+        "all_text": raw.get("all_text") or f"{raw.get('title') or ''}. {text}. {step_text}",
+    }
+
+
+def load_recipes(path) -> list[dict]:
+    path = Path(path)
+    if path.is_dir():
+        items = list(iter_recipes(str(path)))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+    return [normalize_recipe(r) for r in items]
+
+
+class HashingEmbedder:
+    """Embedding tiruan: jumlah vector random per token (seed tetap), dinormalisasi.
+    Text dengan token yang sama jadi mirip, cukup untuk mengukur recall relatif."""
+
+    def __init__(self, dim: int, buckets: int = 1 << 15, seed: int = 0):
+        self.dim = dim
+        self.buckets = buckets
+        self.table = np.random.default_rng(seed).standard_normal((buckets, dim)).astype(np.float32)
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        out = []
+        for text in texts:
+            tokens = [t for t in text.lower().replace(",", " ").replace(".", " ").split() if t]
+            rows = [int(hashlib.md5(t.encode()).hexdigest()[:8], 16) % self.buckets for t in tokens]
+            vec = self.table[rows].sum(axis=0) if rows else np.zeros(self.dim, dtype=np.float32)
+            norm = np.linalg.norm(vec)
+            out.append((vec / norm if norm else vec).tolist())
+        return out
+
+
+def sample_queries(recipes: list[dict], n: int, seed: int = 0) -> list[str]:
+    """Query ala user: 1-3 bahan dari satu resep, tanpa takaran."""
+    rng = random.Random(seed)
+    queries = []
+    for recipe in rng.sample(recipes, min(n, len(recipes))):
+        names = [" ".join(w for w in ing.split() if not any(c.isdigit() for c in w))
+                 for ing in recipe["ingredients"]]
+        names = [name for name in names if name]
+        if names:
+            queries.append(", ".join(rng.sample(names, min(len(names), rng.randint(1, 3)))))
+    return queries
+
+
+def build_fixture(out_dir, recipes: list[dict], queries: list[str], embed, dim: int, coarse_dims=(),
+                  batch_size: int = 64):
+    out = Path(out_dir)
+    (out / "recipes").mkdir(parents=True, exist_ok=True)
+    with open(out / "recipes" / "recipes.json", "w", encoding="utf-8") as f:
+        json.dump(recipes, f, ensure_ascii=False)
+
+    bm25 = BM25Encoder(stem=False)
+    bm25.fit([r["text"] for r in recipes])
+    bm25.dump(str(out / "bm25_params.json"))
+    encoder = load_bm25_encoder(out / "bm25_params.json", strict=True)
+
+    index = LocalVectorIndex(out / "index")
+    for batch in batched(recipes, batch_size):
+        ing_vectors = embed([r["text"] for r in batch])
+        all_vectors = embed([r["all_text"] for r in batch])
+        sparse = encoder.encode_documents([r["text"] for r in batch])
+        index.upsert_dense([{"id": r["id"], "values": v} for r, v in zip(batch, ing_vectors) if v], NAMESPACE)
+        for coarse_dim in coarse_dims:
+            index.upsert_dense([{"id": r["id"], "values": truncate_vectors(v, coarse_dim).tolist()}
+                                for r, v in zip(batch, ing_vectors) if v], coarse_namespace(NAMESPACE, coarse_dim))
+        index.upsert_dense([{"id": r["id"], "values": v} for r, v in zip(batch, all_vectors) if v], NAMESPACE2)
+        index.upsert_dense([{"id": r["id"], "values": blend_vectors(v_ing, v_all, FINAL_LAMBDA).tolist()}
+                            for r, v_ing, v_all in zip(batch, ing_vectors, all_vectors) if v_ing and v_all],
+                           NAMESPACE_FINAL)
+        index.upsert_sparse([{"id": r["id"], "sparse_values": s} for r, s in zip(batch, sparse) if s["indices"]],
+                            NAMESPACE)
+    index.save()
+
+    recorded = [{"query": q, "dense": v, "sparse": s}
+                for q, v, s in zip(queries, embed(queries), encoder.encode_queries(queries)) if v]
+    with open(out / "queries.json", "w", encoding="utf-8") as f:
+        json.dump(recorded, f)
+    with open(out / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "namespace": NAMESPACE, "namespace2": NAMESPACE2, "namespace_final": NAMESPACE_FINAL,
+                   "coarse_dims": list(coarse_dims),
+                   "recipes": len(recipes), "queries": len(recorded)}, f)
+    print(f"fixture written to {out}: {len(recipes)} recipes, {len(recorded)} queries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", choices=["record", "synthetic"])
+    parser.add_argument("--recipes", required=True, help="folder data/clean atau file json resep")
+    parser.add_argument("--queries", help="file txt, satu query per baris (default: diambil dari resep)")
+    parser.add_argument("--n-queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, help="ambil n resep pertama saja")
+    parser.add_argument("--dim", type=int, default=int(os.getenv("EMBED_DIM") or 1024))
+    parser.add_argument("--coarse-dims", type=int, nargs="*", default=[128, 256],
+                        help="index Matryoshka untuk two-stage search (harus < --dim)")
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent / "fixture"))
+    args = parser.parse_args()
+
+    recipes = load_recipes(args.recipes)[:args.limit]
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = sample_queries(recipes, args.n_queries)
+
+    if args.source == "record":
+        from pipeline.get_embedding import get_dense_embeddings_batch
+
+        def embed(texts):
+            return get_dense_embeddings_batch(texts, args.dim)
+    else:
+        embed = HashingEmbedder(args.dim)
+
+    build_fixture(args.out, recipes, queries, embed, args.dim, [d for d in args.coarse_dims if d < args.dim])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/quantization.py
+"""Akurasi dan memory vector float16 / int8 dibanding float32, di atas
+fixture benchmarks/fixtures.py:
+
+- index: top-k dense query dari local index yang disimpan dengan dtype itu
+- session: urutan rekomendasi (resep pertama + rating) dari pool dengan dtype itu
+- cache: ukuran hasil query yang disimpan di query cache
+
+    python benchmarks/quantization.py --fixture benchmarks/fixture
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run import configure  # noqa: E402
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _nbytes(packed) -> int:
+    _, vectors = packed
+    return sum(matrix.nbytes for _, _, matrix in vectors.values())
+
+
+def index_report(fixture: Path, recorded, namespace, top_k):
+    from pipeline.vector_index import LocalVectorIndex
+
+    source = LocalVectorIndex(fixture / "index")
+    ns = source._dense_ns(namespace)
+    vectors = ns.matrix.to_float32()
+    report, exact = {}, None
+    for dtype in DTYPES:
+        root = Path(tempfile.mkdtemp())
+        try:
+            index = LocalVectorIndex(root, dtype)
+            index.upsert_dense([{"id": _id, "values": v} for _id, v in zip(ns.ids, vectors)], namespace)
+            index.save()
+            results = [index.query_dense(namespace, q["dense"], top_k) for q in recorded]
+            size = sum(p.stat().st_size for p in (root / namespace).glob("dense*.npy"))
+        finally:
+            shutil.rmtree(root)
+        ids = [[m["id"] for m in r] for r in results]
+        scores = [{m["id"]: m["score"] for m in r} for r in results]
+        if exact is None:
+            exact = (ids, scores)
+        recall = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(ids, exact[0])])
+        same = np.mean([a == b for a, b in zip(ids, exact[0])])
+        score_err = max((abs(s[_id] - e[_id]) for s, e in zip(scores, exact[1]) for _id in s if _id in e),
+                        default=0.0)
+        report[dtype] = {"bytes": size, f"recall@{top_k}": float(recall), "same_order": float(same),
+                         "max_score_err": float(score_err)}
+    return report
+
+
+def session_report(recorded, steps):
+    from AlgorithmClass import AlgorithmClass
+    from pipeline import rag_pipeline as rp
+    from pipeline.query_context import QueryContext
+
+    def session(q, recipes, dtype):
+        algorithm = AlgorithmClass()
+        algorithm.vector_dtype = dtype
+        algorithm.mapping_input(q["query"], q["dense"])
+        algorithm.mapping_output(recipes)
+        algorithm.first_generate_recipe()
+        for step in range(steps):
+            algorithm.rating_recipe(rating=[-1, 1, 5, 3, -5][step % 5])
+        return [view.index for view in algorithm.selected], algorithm.candidates.nbytes
+
+    sessions = []
+    for q in recorded:
+        recipes = rp.RAG_pipeline(q["query"], QueryContext(q["query"], dense=q["dense"], sparse=q["sparse"]))
+        if recipes:
+            sessions.append((q, recipes))
+
+    report, exact = {}, None
+    for dtype in DTYPES:
+        picks, sizes, packed = [], [], []
+        for q, recipes in sessions:
+            p, size = session(q, recipes, dtype)
+            picks.append(p)
+            sizes.append(size)
+            rp_dtype, rp.VECTOR_DTYPE = rp.VECTOR_DTYPE, dtype
+            try:
+                packed.append(_nbytes(rp._pack_results(recipes)))
+            finally:
+                rp.VECTOR_DTYPE = rp_dtype
+        if exact is None:
+            exact = picks
+        pairs = list(zip(picks, exact))
+        report[dtype] = {
+            "pool_bytes": float(np.mean(sizes)) if sizes else 0.0,
+            "cache_bytes_per_query": float(np.mean(packed)) if packed else 0.0,
+            "same_first_pick": float(np.mean([a[0] == b[0] for a, b in pairs])) if pairs else 0.0,
+            "same_pick_rate": float(np.mean([np.mean([x == y for x, y in zip(a, b)]) for a, b in pairs]))
+            if pairs else 0.0,
+            "same_session": float(np.mean([a == b for a, b in pairs])) if pairs else 0.0,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default=str(Path(__file__).resolve().parent / "fixture"))
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--session-steps", type=int, default=10)
+    parser.add_argument("--json", help="simpan hasil ke file json")
+    args = parser.parse_args()
+
+    fixture = Path(args.fixture).resolve()
+    meta = configure(fixture)
+    with open(fixture / "queries.json", "r", encoding="utf-8") as f:
+        recorded = json.load(f)
+
+    results = {"index": index_report(fixture, recorded, meta["namespace"], args.top_k),
+               "session": session_report(recorded, args.session_steps)}
+    for section, rows in results.items():
+        print(f"[{section}]")
+        for dtype, row in rows.items():
+            print(f"  {dtype:<8} " + "  ".join(
+                f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
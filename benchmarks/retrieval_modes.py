@@ -0,0 +1,77 @@
+# benchmarks/retrieval_modes.py
+"""Bandingkan mode retrieval (sparse-first vs dense vs hybrid RRF vs weighted):
+recall@k dan latency p50/p95 per query.
+
+Input: file jsonl, satu query per baris: {"query": "ayam goreng", "relevant": ["id1", "id2"]}
+
+    python benchmarks/retrieval_modes.py queries.jsonl --k 10 --repeat 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pipeline.query_context import QueryContext  # noqa: E402
+from pipeline.rag_pipeline import RETRIEVAL_MODES, retrieve_candidates  # noqa: E402
+
+
+def load_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recall_at_k(result_ids, relevant, k):
+    if not relevant:
+        return None
+    return len(set(result_ids[:k]) & set(relevant)) / len(relevant)
+
+
+def run_mode(mode, queries, k, repeat):
+    latencies, recalls = [], []
+    for _ in range(repeat):
+        for q in queries:
+            # QueryContext baru tiap query supaya embedding query ikut terukur
+            ctx = QueryContext(q["query"])
+            start = time.perf_counter()
+            results = retrieve_candidates(q["query"], ctx, mode)
+            latencies.append(time.perf_counter() - start)
+            r = recall_at_k([res["id"] for res in results], q.get("relevant") or [], k)
+            if r is not None:
+                recalls.append(r)
+    latencies = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        f"recall@{k}": float(np.mean(recalls)) if recalls else float("nan"),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "queries": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="jsonl berisi query + id resep yang relevan")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", default=list(RETRIEVAL_MODES), choices=RETRIEVAL_MODES)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    # warm-up: koneksi, BM25, recipe store
+    for mode in args.modes:
+        retrieve_candidates(queries[0]["query"], QueryContext(queries[0]["query"]), mode)
+
+    rows = [run_mode(mode, queries, args.k, args.repeat) for mode in args.modes]
+    print(f"{'mode':<10} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'n':>6}")
+    for row in rows:
+        print(f"{row['mode']:<10} {row[f'recall@{args.k}']:>10.3f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['queries']:>6}")
+
+
+if __name__ == "__main__":
+    main()
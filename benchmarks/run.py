@@ -0,0 +1,293 @@
+# benchmarks/run.py
+"""Benchmark retrieval + rekomendasi secara offline di atas fixture
+(benchmarks/fixtures.py): tahap-tahap RAG_pipeline (termasuk embed query
+lewat client + cache, provider diganti rekaman), mapping_output,
+mmr_rerank untuk beberapa ukuran pool, dan satu sesi rating penuh.
+
+    python benchmarks/run.py --fixture benchmarks/fixture --json out.json
+    python benchmarks/run.py --baseline out.json   # exit 1 kalau p95 lebih lambat dari toleransi
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def configure(fixture: Path, final: bool = False, coarse_dim: int = 0):
+    """Arahkan pipeline ke fixture. Harus dipanggil sebelum import modul pipeline."""
+    with open(fixture / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_DIR": str(fixture / "index"),
+        "NAMESPACE": meta["namespace"],
+        "NAMESPACE2": meta["namespace2"],
+        "EMBED_DIM": str(meta["dim"]),
+        "RECIPES_FOLDER": str(fixture / "recipes"),
+        "RECIPE_STORE_PATH": str(Path(tempfile.mkdtemp()) / "recipes.sqlite"),
+        "BM25_PATH": str(fixture / "bm25_params.json"),
+        # yang diukur pipeline-nya, bukan cache
+        "QUERY_CACHE": "0",
+        "EMBED_CACHE": "0",
+    })
+    if final:
+        if not meta.get("namespace_final"):
+            raise SystemExit("fixture has no final vectors, rebuild it with benchmarks/fixtures.py")
+        os.environ["NAMESPACE_FINAL"] = meta["namespace_final"]
+    if coarse_dim:
+        if coarse_dim not in meta.get("coarse_dims", []):
+            raise SystemExit(f"fixture has no {coarse_dim}-dim coarse index, rebuild it with --coarse-dims")
+        os.environ["COARSE_DIM"] = str(coarse_dim)
+    return meta
+
+
+_synthetic_fixtures = {}
+
+
+def synthetic_fixture(recipes=ROOT / "data" / "raw" / "cookpad_recipe_ayam.json", limit: int = 300,
+                      dim: int = 64, n_queries: int = 20, coarse_dims=(32,)) -> Path:
+    """Fixture synthetic kecil di folder temp untuk test offline (tc_*.py), dibuat
+    sekali per proses. Dibangun lewat CLI fixtures.py di subprocess, jadi modul
+    pipeline di proses ini belum ter-import sebelum configure()."""
+    key = (str(recipes), limit, dim, n_queries, tuple(coarse_dims))
+    if key not in _synthetic_fixtures:
+        out = Path(tempfile.mkdtemp(prefix="fixture-"))
+        proc = subprocess.run([sys.executable, str(Path(__file__).resolve().parent / "fixtures.py"), "synthetic",
+                               "--recipes", str(recipes), "--limit", str(limit), "--dim", str(dim),
+                               "--n-queries", str(n_queries), "--coarse-dims", *map(str, coarse_dims),
+                               "--out", str(out)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError(f"building fixture failed:\n{proc.stderr[-2000:]}")
+        _synthetic_fixtures[key] = out
+    return _synthetic_fixtures[key]
+
+
+class _RecordedResponse:
+    status_code = 200
+
+    def __init__(self, body: str):
+        self.text = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def recorded_embedding_client(recorded: list[dict]):
+    """EmbeddingClient asli (payload, retry, parse JSON) dengan session.post yang
+    menjawab dari rekaman fixture: yang diukur overhead client + cache, bukan
+    latency provider."""
+    from pipeline.get_embedding import EmbeddingClient
+
+    dense = {q["query"]: q["dense"] for q in recorded}
+    client = EmbeddingClient(url="http://recorded.invalid/embeddings", api_key="recorded")
+
+    def post(url, **kwargs):
+        inputs = kwargs["json"]["input"]
+        return _RecordedResponse(json.dumps({"data": [{"index": i, "embedding": dense[text]}
+                                                      for i, text in enumerate(inputs)]}))
+    client.session.post = post
+    return client
+
+
+def timed(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples_ms = np.array(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p95_ms": float(np.percentile(samples_ms, 95)),
+        "ops_per_s": float(len(samples) / sum(samples)) if sum(samples) else float("inf"),
+        "n": len(samples),
+    }
+
+
+def peak_memory(fn) -> int:
+    """Peak alokasi python (byte) selama satu kali fn()."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cycle(items):
+    state = {"i": 0}
+
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+
+def run(fixture: Path, repeat: int, pool_sizes: list[int], session_steps: int, final: bool = False,
+        coarse_dim: int = 0) -> dict:
+    configure(fixture, final, coarse_dim)
+    # import setelah env di-set
+    from AlgorithmClass import AlgorithmClass
+    from pipeline import rag_pipeline as rp
+    from pipeline.query_context import QueryContext
+
+    with open(fixture / "queries.json", "r", encoding="utf-8") as f:
+        recorded = json.load(f)
+    if not recorded:
+        raise SystemExit("fixture has no queries")
+
+    def context(q, with_sparse=True):
+        # dense dari rekaman; sparse direkam juga, kecuali saat BM25 encode yang diukur
+        return QueryContext(q["query"], dense=q["dense"], sparse=q["sparse"] if with_sparse else None)
+
+    bm25 = rp.bm25.get()
+    next_query = cycle(recorded)
+    results = {}
+
+    def stage(name, fn, n=repeat):
+        results[name] = {**timed(fn, n), "peak_bytes": peak_memory(fn)}
+
+    # ---------- tahap RAG ----------
+    from pipeline import get_embedding as ge
+    from pipeline.embedding_cache import EmbeddingCache
+    embed_client = recorded_embedding_client(recorded)
+    texts = [q["query"] for q in recorded]
+    with mock.patch.object(ge.client, "get", lambda: embed_client):
+        with mock.patch.object(ge, "cache", None):
+            stage("rag.embed[client]", lambda: ge.get_dense_embeddings(next_query()["query"]))
+            stage(f"rag.embed_batch[{len(texts)},client]", lambda: ge.get_dense_embeddings_batch(texts))
+        with mock.patch.object(ge, "cache", EmbeddingCache(str(Path(tempfile.mkdtemp()) / "embed.sqlite"))):
+            ge.get_dense_embeddings_batch(texts)
+            stage("rag.embed[cache_hit]", lambda: ge.get_dense_embeddings(next_query()["query"]))
+    stage("rag.bm25_encode", lambda: context(next_query(), with_sparse=False).get_sparse(bm25))
+    stage("rag.sparse_query", lambda: rp._sparse_query(context(next_query())))
+
+    candidate_ids = [[m["id"] for m in rp._sparse_query(context(q))] or
+                     [r["id"] for r in rp._dense_query(q["dense"])] for q in recorded]
+    next_ids = cycle(candidate_ids)
+    stage("rag.dense_query", lambda: rp._dense_query(next_query()["dense"]))
+    stage("rag.fetch_vectors", lambda: rp.fetch_vectors(next_ids(), (rp.NAMESPACE, rp.NAMESPACE2)))
+    stage("rag.metadata_merge", lambda: rp._merge_recipe_data([{"id": _id} for _id in next_ids()]))
+    for mode in rp.RETRIEVAL_MODES:
+        stage(f"rag.pipeline[{mode}]", lambda mode=mode: (
+            lambda q: rp.RAG_pipeline(q["query"], context(q), mode))(next_query()))
+
+    # ---------- rekomendasi ----------
+    recipes_per_query = [rp.RAG_pipeline(q["query"], context(q)) for q in recorded]
+    recipes_per_query = [r for r in recipes_per_query if r] or [[]]
+    next_recipes = cycle(recipes_per_query)
+
+    def mapping_output():
+        algorithm = AlgorithmClass()
+        algorithm.mapping_output(next_recipes())
+    stage("algo.mapping_output", mapping_output)
+
+    # pool besar dibuat dari vector fixture (diulang + noise kecil)
+    base = [r for recipes in recipes_per_query for r in recipes]
+    rng = np.random.default_rng(0)
+    user_pref = np.asarray(recorded[0]["dense"], dtype=np.float32)
+    for size in pool_sizes:
+        if not base:
+            break
+        pool_recipes = []
+        for i in range(size):
+            r = base[i % len(base)]
+            key = "final_vector" if "final_vector" in r else "values"
+            noise = rng.standard_normal(len(r[key])).astype(np.float32) * 0.01
+            pool_recipes.append({**r, key: np.asarray(r[key]) + noise})
+
+        def mmr(pool_recipes=pool_recipes):
+            algorithm = AlgorithmClass()
+            algorithm.mapping_input("", user_pref)
+            algorithm.mapping_output(pool_recipes)
+            algorithm.mmr_rerank(lambd=0.7, top_k=10)
+        stage(f"algo.mmr_rerank[pool={size},top_k=10]", mmr, n=max(3, repeat // 4))
+
+    def session():
+        q = next_query()
+        algorithm = AlgorithmClass()
+        algorithm.mapping_input(q["query"], q["dense"])
+        recipes = rp.RAG_pipeline(q["query"], context(q))
+        if not recipes:
+            return
+        algorithm.mapping_output(recipes)
+        algorithm.first_generate_recipe()
+        for step in range(session_steps):
+            algorithm.rating_recipe(rating=[-1, 1, 5, 3, -5][step % 5])
+    stage(f"session[{session_steps} ratings]", session)
+
+    results["_process"] = {"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    return results
+
+
+def print_table(results: dict):
+    print(f"{'benchmark':<42} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>10} {'peak MB':>9}")
+    for name, row in results.items():
+        if name.startswith("_"):
+            continue
+        print(f"{name:<42} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['ops_per_s']:>10.1f} "
+              f"{row['peak_bytes'] / 1e6:>9.2f}")
+    print(f"max RSS: {results['_process']['max_rss_mb']:.0f} MB")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, row in results.items():
+        old = baseline.get(name)
+        if name.startswith("_") or not old:
+            continue
+        # abaikan benchmark yang sangat cepat, noise-nya lebih besar dari sinyal
+        if row["p95_ms"] > max(old["p95_ms"] * (1 + tolerance), old["p95_ms"] + 0.5):
+            regressions.append(f"{name}: p95 {old['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default=str(Path(__file__).resolve().parent / "fixture"))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[50, 500, 2000, 10000])
+    parser.add_argument("--session-steps", type=int, default=10)
+    parser.add_argument("--final", action="store_true", help="pakai final vector dari ingestion (NAMESPACE_FINAL)")
+    parser.add_argument("--coarse-dim", type=int, default=0, help="two-stage dense search dengan index COARSE_DIM")
+    parser.add_argument("--json", help="simpan hasil ke file json (dipakai sebagai baseline)")
+    parser.add_argument("--baseline", help="hasil --json sebelumnya untuk dibandingkan")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="batas kenaikan p95 (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(Path(args.fixture).resolve(), args.repeat, args.pool_sizes, args.session_steps, args.final,
+                  args.coarse_dim)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("no regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
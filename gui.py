@@ -1,10 +1,29 @@
 import json
+import os
+import threading
 import gradio as gr
 from AlgorithmClass import AlgorithmClass
 from helper import MultimodalModel
 from rag import Datahandle
-algorithm = AlgorithmClass()
+from session_store import SessionStore
+from pipeline.resources import warm_up
+
+SESSION_TTL = int(os.getenv("SESSION_TTL")) if os.getenv("SESSION_TTL") else 1800
+SESSION_MAX = int(os.getenv("SESSION_MAX")) if os.getenv("SESSION_MAX") else 500
+SESSION_MAX_MB = int(os.getenv("SESSION_MAX_MB")) if os.getenv("SESSION_MAX_MB") else 512
+GRADIO_CONCURRENCY = int(os.getenv("GRADIO_CONCURRENCY")) if os.getenv("GRADIO_CONCURRENCY") else 8
+
 data_handler = Datahandle()
+# satu model (client Together + cache hasil ekstraksi bahan) untuk semua upload
+multimodal_model = MultimodalModel()
+# satu AlgorithmClass per session browser, supaya user_pref dan kandidat tidak tercampur antar user
+sessions = SessionStore(
+    AlgorithmClass,
+    ttl=SESSION_TTL,
+    max_sessions=SESSION_MAX,
+    max_bytes=SESSION_MAX_MB * 1024 * 1024,
+    sizeof=lambda algorithm: algorithm.candidates.nbytes if algorithm.candidates is not None else 0,
+)
 
 # ini ganti dengan rag beneran dan embedding custom # <-- disini bay
 
@@ -74,13 +93,10 @@ javascript_code = """
 # Perhatikan tidak ada lagi tag <script> di sini.
 
 
-def render_steps(input_text=None):
-    if not input_text or input_text.strip() == "":
+def render_steps(input_text=None, result=None):
+    if not input_text or input_text.strip() == "" or result is None:
         return "<p>Please enter some text and press 'Generate' to see the recipe.</p>"
 
-    # Simulasi hasil dari algoritma Anda
-    result = algorithm.get_recipe()
-
     # Ambil data
     cover_img = result.get("image")
     title = result.get("title")
@@ -153,30 +169,71 @@ def upload_file(file):
 
 
 def text_replace(file):
-    model = MultimodalModel()
-    return model.generate(file)
+    return multimodal_model.generate(file)
 
 
-def generate_recipe(input_text):
-    # bikin HTML dari text
+def generate_recipe(input_text, request: gr.Request):
+    """Generator: resep pertama (pick MMR pertama, dari vector kandidat) langsung
+    ditampilkan setelah retrieval, metadata kandidat lain di-hydrate di background.
+    Rating + next baru muncul setelah pool kandidat siap."""
+    algorithm = sessions.get_or_create(request.session_hash)
     algorithm.reset()
-    embedding_input = data_handler.get_embeddings_input(input_text)
-
-    algorithm.mapping_input(input_text, embedding_input)
-    recipes = data_handler.get_recipes(input_text)
+    # embedding query cukup sekali, dipakai untuk user_pref dan retrieval
+    ctx = data_handler.get_query_context(input_text)
+
+    algorithm.mapping_input(input_text, ctx.get_dense())
+    # query populer langsung dari cache, tanpa retrieval
+    recipes = data_handler.get_cached_recipes(input_text)
+    first = None
+    if recipes is None:
+        candidates = data_handler.retrieve_candidates(input_text, ctx)
+        # vector kandidat cukup untuk pick MMR pertama, metadata di-hydrate di background
+        data_handler.attach_vectors(candidates)
+        hydrating = data_handler.hydrate_candidates_async(candidates)
+
+        if candidates:
+            # resep yang sama dengan yang akan dipilih first_generate_recipe, cukup ambil metadata satu resep
+            first = algorithm.first_pick(candidates)
+            preview = data_handler.get_recipe_metadata(candidates[first]["id"]) if first is not None else None
+            if preview:
+                yield render_steps(input_text, preview), gr.update(visible=False), gr.update(visible=False)
+            else:
+                first = None
+
+        recipes = hydrating.result()
+        data_handler.cache_recipes(input_text, recipes)
+
+    if not recipes:
+        yield "<p>No recipe found, try other ingredients.</p>", gr.update(visible=False), gr.update(visible=False)
+        return
 
     embeddings_all, embedings_ingredients = data_handler.get_embeddings_recipe(
         recipes)
 
     algorithm.mapping_output(
         recipes, embeddings_all, embedings_ingredients)
-    algorithm.first_generate_recipe()
-    return render_steps(input_text), gr.update(visible=True), gr.update(visible=True)
+    # resep yang sudah tampil jadi pilihan pertama supaya rating berlaku ke resep itu
+    algorithm.first_generate_recipe(first)
+    # ukuran kandidat baru diketahui di sini, cek lagi batas memory
+    sessions.touch(request.session_hash)
+    steps = gr.update() if first is not None else render_steps(input_text, algorithm.get_recipe())
+    yield steps, gr.update(visible=True), gr.update(visible=True)
+
+
+def next_recommendation(input_text, rating, request: gr.Request):
+    algorithm = sessions.get(request.session_hash)
+    if algorithm is None or algorithm.candidates is None:
+        # session expired / dibuang, mulai ulang dari query
+        for _ in generate_recipe(input_text, request):
+            pass
+        algorithm = sessions.get(request.session_hash)
+        return render_steps(input_text, algorithm.get_recipe() if algorithm else None)
+    algorithm.rating_recipe(rating)
+    return render_steps(input_text, algorithm.get_recipe())
 
 
-def next_recommendation(input_text, rating):
-    algorithm.rating_recipe(rating)
-    return render_steps(input_text)
+def end_session(request: gr.Request):
+    sessions.drop(request.session_hash)
 
 
 with gr.Blocks(js=javascript_code,
@@ -257,4 +314,9 @@ with gr.Blocks(js=javascript_code,
         outputs=[steps_html]
     )
 
+    demo.unload(end_session)
+
+demo.queue(default_concurrency_limit=GRADIO_CONCURRENCY)
+# koneksi index + model dibuat di background selama UI mulai jalan
+threading.Thread(target=warm_up, daemon=True).start()
 demo.launch(server_name="0.0.0.0", server_port=7860)
@@ -2,46 +2,165 @@
 from together import Together
 from dotenv import load_dotenv
 import base64
+import hashlib
+import io
 import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from pipeline.resources import LazyResource
 load_dotenv()
 
+MULTIMODAL_MODEL = os.getenv("MULTIMODAL_MODEL") or "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8"
+INGREDIENT_PROMPT = "Apa saja yang ada di gambar itu? sebutkan saja bahan makanan nya, dipisah oleh koma. Jangan tambahkan penjelasan apapun selain daftar bahan makanannya."
+# foto HP di-resize (sisi terpanjang) dan di-encode ulang ke JPEG sebelum upload
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE")) if os.getenv("IMAGE_MAX_SIDE") else 1024
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY")) if os.getenv("IMAGE_JPEG_QUALITY") else 85
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE")) if os.getenv("IMAGE_CACHE_SIZE") else 512
 
-def image_to_data_url(image_path):
+# error PIL saat decode / resize gambar upload: file rusak, EXIF aneh, atau gambar
+# terlalu besar (DecompressionBombError); semuanya fallback ke kirim file asli
+IMAGE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+# satu client Together untuk semua request, dibuat saat pertama dipakai
+together_client = LazyResource("together_client", Together)
+
+
+def image_to_data_url(image_path, max_side=IMAGE_MAX_SIDE):
     """
     Membaca file gambar, mengonversinya ke Base64, dan mengembalikannya sebagai Data URL.
+    Gambar di-downscale ke `max_side` dulu (None = file asli).
     """
+    with open(image_path, "rb") as image_file:
+        binary_data = image_file.read()
+    if max_side:
+        try:
+            with Image.open(io.BytesIO(binary_data)) as image:
+                return bytes_to_data_url(*downscale_image(image, max_side))
+        except IMAGE_ERRORS:
+            # bukan gambar yang bisa dibaca PIL, kirim apa adanya
+            pass
+
     # Tebak tipe MIME dari file gambar (misalnya, 'image/jpeg', 'image/png')
     mime_type, _ = mimetypes.guess_type(image_path)
     if mime_type is None:
         # Jika tidak bisa ditebak, gunakan default 'application/octet-stream'
         mime_type = "application/octet-stream"
+    return bytes_to_data_url(binary_data, mime_type)
+
+
+def bytes_to_data_url(binary_data, mime_type):
+    # Encode konten biner ke Base64 dan ubah menjadi string
+    base64_encoded_data = base64.b64encode(binary_data).decode('utf-8')
+    # Kembalikan sebagai Data URL yang diformat dengan benar
+    return f"data:{mime_type};base64,{base64_encoded_data}"
+
+
+def resize_image(image, max_side=IMAGE_MAX_SIDE):
+    """RGB, orientasi EXIF diterapkan, sisi terpanjang <= max_side."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def downscale_image(image, max_side=IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY):
+    """Resize (lihat resize_image) lalu encode ulang ke JPEG. Return: (bytes, mime type)."""
+    return encode_jpeg(resize_image(image, max_side), quality)
 
-    # Buka file dalam mode baca biner ('rb')
-    with open(image_path, "rb") as image_file:
-        # Baca konten biner file
-        binary_data = image_file.read()
-        # Encode konten biner ke Base64 dan ubah menjadi string
-        base64_encoded_data = base64.b64encode(binary_data).decode('utf-8')
-        # Kembalikan sebagai Data URL yang diformat dengan benar
-        return f"data:{mime_type};base64,{base64_encoded_data}"
+
+def encode_jpeg(image, quality=IMAGE_JPEG_QUALITY):
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue(), "image/jpeg"
+
+
+class IngredientCache:
+    """Hasil ekstraksi bahan per gambar (LRU di memory).
+
+    Key-nya hash exact: sha256 isi file (upload ulang file yang sama) dan
+    sha256 pixel gambar hasil downscale (file beda tapi gambarnya sama, mis.
+    hanya metadata yang berubah). Foto yang hanya mirip tidak pernah memakai daftar
+    bahan gambar lain.
+    """
+
+    def __init__(self, max_items=IMAGE_CACHE_SIZE):
+        self.max_items = max_items
+        self._items = OrderedDict()  # hash -> text
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            text = self._items.get(key)
+            if text is not None:
+                self._items.move_to_end(key)
+            return text
+
+    def put(self, keys, text):
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._items[key] = text
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
 
 
 class MultimodalModel:
-    def __init__(self):
-        self.client = Together()
+    def __init__(self, client=None, cache=None):
+        self._client = client
+        self.cache = cache if cache is not None else IngredientCache()
+
+    @property
+    def client(self):
+        return self._client or together_client.get()
+
+    def _key(self, data: bytes) -> str:
+        # cache per model + prompt, hasil model lain tidak dipakai ulang
+        return hashlib.sha256(MULTIMODAL_MODEL.encode() + INGREDIENT_PROMPT.encode() + data).hexdigest()
 
     def generate(self, image_path):
-        # Ubah path gambar menjadi Data URL
-        data_url = image_to_data_url(image_path)
+        with open(image_path, "rb") as image_file:
+            binary_data = image_file.read()
+        content_hash = self._key(binary_data)
+        cached = self.cache.get(content_hash)
+        if cached is not None:
+            return cached
+
+        try:
+            image = Image.open(io.BytesIO(binary_data))
+            # JPEG langsung di-decode di resolusi kecil, cukup untuk downscale
+            image.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+            image = resize_image(image)
+        except IMAGE_ERRORS:
+            image = None
+
+        image_hash = self._key(image.tobytes()) if image is not None else None
+        cached = self.cache.get(image_hash)
+        if cached is not None:
+            self.cache.put((content_hash,), cached)
+            return cached
+
+        # Ubah gambar (sudah di-downscale) menjadi Data URL
+        data_url = bytes_to_data_url(*encode_jpeg(image)) if image is not None else \
+            image_to_data_url(image_path, max_side=None)
         response = self.client.chat.completions.create(
-            model="meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8",
+            model=MULTIMODAL_MODEL,
             messages=[{
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Apa saja yang ada di gambar itu? sebutkan saja bahan makanan nya, dipisah oleh koma. Jangan tambahkan penjelasan apapun selain daftar bahan makanannya."},
+                    {"type": "text", "text": INGREDIENT_PROMPT},
                     {"type": "image_url", "image_url": {
                         "url": f"{data_url}"}}
                 ]
             }]
         )
-        return response.choices[0].message.content
+        text = response.choices[0].message.content
+        if text:
+            self.cache.put((content_hash, image_hash), text)
+        return text
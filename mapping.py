@@ -1,4 +1,26 @@
+import os
+import numpy as np
 from typing import List
+from dotenv import load_dotenv
+from pipeline.quantize import VECTOR_DTYPE, QuantizedMatrix
+
+load_dotenv()
+
+# bobot vector bahan di final vector (sisanya vector all-text)
+FINAL_LAMBDA = float(os.getenv("FINAL_LAMBDA")) if os.getenv("FINAL_LAMBDA") else 0.5
+
+
+def blend_vectors(ingredients, all_text, lambd: float = FINAL_LAMBDA) -> np.ndarray:
+    """final = lambd * ingredients + (1 - lambd) * all_text (vector atau matrix per baris).
+    Tidak dinormalisasi: update_user_pref memakai final vector apa adanya, jadi
+    final vector dari ingestion (NAMESPACE_FINAL) harus sama persis dengan blend per request."""
+    if not (0.0 <= lambd <= 1.0):
+        raise ValueError("lambd must be in [0, 1]")
+    e1 = np.asarray(ingredients, dtype=np.float32)
+    e2 = np.asarray(all_text, dtype=np.float32)
+    if e1.shape != e2.shape:
+        raise ValueError(f"Shape mismatch: {e1.shape} vs {e2.shape}")
+    return lambd * e1 + (1.0 - lambd) * e2
 
 
 class MappingOutput:
@@ -20,3 +42,151 @@ class MappingOutput:
             return f"MappingOutput(title={self.title}, image={self.image}, ingredients={self.ingredients}, steps={self.steps})"
         else:
             return f"MappingOutput(title={self.title}, image={self.image}, ingredients={self.ingredients}, steps={self.steps}, ingredients_vector={self.ingredients_vector}, all_vector={self.all_vector}, final_vector={self.final_vector})"
+
+
+class CandidateView:
+    ''' View ringan (tanpa copy) ke satu baris CandidatePool.'''
+    __slots__ = ("pool", "index")
+
+    def __init__(self, pool: "CandidatePool", index: int):
+        self.pool = pool
+        self.index = index
+
+    @property
+    def title(self):
+        return self.pool.titles[self.index]
+
+    @property
+    def image(self):
+        return self.pool.images[self.index]
+
+    @property
+    def ingredients(self):
+        return self.pool.ingredients[self.index]
+
+    @property
+    def steps(self):
+        return self.pool.steps[self.index]
+
+    @property
+    def ingredients_vector(self):
+        if self.pool.ingredients_vectors is None:
+            return None
+        return self.pool.ingredients_vectors[self.index]
+
+    @property
+    def all_vector(self):
+        if self.pool.all_vectors is None:
+            return None
+        return self.pool.all_vectors[self.index]
+
+    @property
+    def final_vector(self):
+        return self.pool.final_vectors[self.index]
+
+    def __eq__(self, other):
+        if not isinstance(other, CandidateView):
+            return NotImplemented
+        return self.pool is other.pool and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.pool), self.index))
+
+    def __str__(self):
+        return f"CandidateView(index={self.index}, title={self.title}, image={self.image}, ingredients={self.ingredients}, steps={self.steps})"
+
+
+def _stack_vectors(vectors, dim: int) -> np.ndarray:
+    ''' Tumpuk list of vector jadi matrix float32, vector kosong/None jadi nol.'''
+    out = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, vec in enumerate(vectors):
+        if vec is not None and len(vec):
+            out[i] = vec
+    return out
+
+
+class CandidatePool:
+    ''' Kandidat resep dalam bentuk kolom: metadata di list, vector di matrix
+    yang contiguous, dan mask `alive` sebagai pengganti list.remove.
+    Matrix disimpan sebagai QuantizedMatrix (float32 / float16 / int8, lihat
+    VECTOR_DTYPE), baris yang dibaca selalu float32.
+    ingredients_vectors / all_vectors None kalau final vector sudah dihitung saat ingestion.'''
+
+    def __init__(self, titles: List, images: List, ingredients: List, steps: List,
+                 ingredients_vectors, all_vectors, final_vectors):
+        n = len(titles)
+        ingredients_vectors, all_vectors, final_vectors = (
+            QuantizedMatrix(m) if isinstance(m, np.ndarray) else m
+            for m in (ingredients_vectors, all_vectors, final_vectors))
+        for name, matrix in (("ingredients_vectors", ingredients_vectors),
+                             ("all_vectors", all_vectors),
+                             ("final_vectors", final_vectors)):
+            if matrix is not None and matrix.shape[0] != n:
+                raise ValueError(f"{name} has {matrix.shape[0]} rows, expected {n}")
+        self.titles = titles
+        self.images = images
+        self.ingredients = ingredients
+        self.steps = steps
+        self.ingredients_vectors = ingredients_vectors
+        self.all_vectors = all_vectors
+        self.final_vectors = final_vectors
+        self.alive = np.ones(n, dtype=bool)
+
+    @classmethod
+    def from_recipes(cls, recipes: List[dict], embeddings_all: List, embeddings_ingredients: List, blend,
+                     dtype: str = VECTOR_DTYPE):
+        ''' blend(all_matrix, ingredients_matrix) -> final_matrix'''
+        dim = max((len(v) for v in list(embeddings_all) + list(embeddings_ingredients) if v is not None), default=0)
+        all_vectors = _stack_vectors(embeddings_all, dim)
+        ingredients_vectors = _stack_vectors(embeddings_ingredients, dim)
+        final_vectors = np.ascontiguousarray(
+            blend(all_vectors, ingredients_vectors), dtype=np.float32)
+        return cls(
+            titles=[r.get('title') for r in recipes],
+            images=[r.get('image', None) for r in recipes],
+            ingredients=[r.get('ingredients', None) for r in recipes],
+            steps=[r.get('steps', None) for r in recipes],
+            ingredients_vectors=QuantizedMatrix.from_float(ingredients_vectors, dtype),
+            all_vectors=QuantizedMatrix.from_float(all_vectors, dtype),
+            final_vectors=QuantizedMatrix.from_float(final_vectors, dtype),
+        )
+
+    @classmethod
+    def from_final_vectors(cls, recipes: List[dict], final_vectors: List, dtype: str = VECTOR_DTYPE, dim: int = 0):
+        ''' Pool dari final vector yang sudah di-blend saat ingestion (NAMESPACE_FINAL).
+        Vector None jadi baris nol; `dim` dipakai kalau tidak ada vector sama sekali.'''
+        dim = max((len(v) for v in final_vectors if v is not None), default=dim)
+        return cls(
+            titles=[r.get('title') for r in recipes],
+            images=[r.get('image', None) for r in recipes],
+            ingredients=[r.get('ingredients', None) for r in recipes],
+            steps=[r.get('steps', None) for r in recipes],
+            ingredients_vectors=None,
+            all_vectors=None,
+            final_vectors=QuantizedMatrix.from_float(_stack_vectors(final_vectors, dim), dtype),
+        )
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __getitem__(self, index: int) -> CandidateView:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return CandidateView(self, index)
+
+    def __iter__(self):
+        return (CandidateView(self, i) for i in range(len(self)))
+
+    @property
+    def n_alive(self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+    def remove(self, index: int):
+        self.alive[index] = False
+
+    def alive_views(self) -> List[CandidateView]:
+        return [CandidateView(self, int(i)) for i in np.flatnonzero(self.alive)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(m.nbytes for m in (self.ingredients_vectors, self.all_vectors, self.final_vectors) if m is not None)
@@ -0,0 +1,118 @@
+from typing import List, Optional
+import numpy as np
+from pipeline.quantize import QuantizedMatrix
+
+# batas selisih skor float32 ke skor tertinggi yang masih dihitung ulang dalam float64
+# (error float32 cosine jauh di bawah ini, termasuk untuk vector 1024 dimensi)
+SCORE_TOL = 1e-3
+
+
+class MMREngine:
+    """Matrix-backed Maximal Marginal Relevance.
+
+    Semua final_vector kandidat ditumpuk jadi satu matrix float32, jadi cosine
+    similarity cukup dihitung dengan matmul lalu dikali inverse norm per baris
+    (matrix tidak di-copy). "max similarity ke item yang sudah dipilih"
+    disimpan sebagai array dan di-update in place setiap kali ada item yang
+    dipilih.
+
+    `vectors` boleh QuantizedMatrix (float16 / int8); scoring float32 dengan
+    dequantize per blok. Kandidat yang skornya hampir seri dengan yang
+    tertinggi (selisih < SCORE_TOL) dihitung ulang dengan relevansi float64
+    seperti versi lama (user_pref list / array float64), jadi urutan pilihan
+    tetap sama walaupun beda skornya di bawah presisi float32.
+
+    `alive` boleh diisi mask milik pool kandidat supaya keduanya berbagi state.
+    """
+
+    def __init__(self, vectors, alive=None):
+        matrix = vectors if isinstance(vectors, QuantizedMatrix) else \
+            QuantizedMatrix(np.asarray(vectors, dtype=np.float32))
+        if len(matrix.shape) != 2:
+            raise ValueError(f"vectors must be 2-D, got shape {matrix.shape}")
+        norms = matrix.row_norms()
+        norms[norms == 0] = 1.0
+        self.matrix = matrix
+        self.norms = norms
+        self.inv_norms = (1.0 / norms).astype(np.float32)
+
+        n = self.matrix.shape[0]
+        self.alive = np.ones(n, dtype=bool) if alive is None else alive
+        self.max_sim_selected = np.full(n, -np.inf, dtype=np.float32)
+        # urutan tie-break, sama seperti urutan list kandidat di versi lama
+        self.rank = np.arange(n)
+        self.picked: List[int] = []
+        self._pending: Optional[int] = None
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def _normalize(self, vec):
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _exact_scores(self, rows, user_pref, lambd):
+        # skor versi lama untuk `rows`: cosine_similarity ke user float64
+        # (dot / (norm user * norm kandidat)), similarity ke item terpilih float32
+        user = np.asarray(user_pref, dtype=np.float64)
+        norm = np.linalg.norm(user)
+        sim_to_user = (self.matrix[rows].astype(np.float64) @ user) / ((norm if norm else 1.0) * self.norms[rows])
+        sim_to_selected = 0.0
+        if self.picked:
+            sim_to_selected = ((self.matrix[rows] @ self.matrix[self.picked].T)
+                               / (self.norms[rows, None] * self.norms[self.picked])).max(axis=1)
+        return lambd * sim_to_user - (1 - lambd) * sim_to_selected
+
+    def select(self, user_pref, lambd=0.7) -> int:
+        """Pilih satu kandidat dengan skor MMR tertinggi dan return index-nya."""
+        if not self.alive.any():
+            raise IndexError("no candidates left")
+
+        user = self._normalize(user_pref)
+        if self._pending is None:
+            sim_to_user = self.matrix.matmul(user) * self.inv_norms
+        else:
+            # similarity ke user dan ke item yang terakhir dipilih dihitung
+            # dalam satu matrix product
+            last = self.matrix[self._pending] * self.inv_norms[self._pending]
+            sims = self.matrix.matmul(np.stack([user, last], axis=1)) * self.inv_norms[:, None]
+            sim_to_user = sims[:, 0]
+            np.maximum(self.max_sim_selected, sims[:, 1], out=self.max_sim_selected)
+            self._pending = None
+
+        # default=0 kalau belum ada item yang dipilih
+        sim_to_selected = self.max_sim_selected if self.picked else 0.0
+        scores = lambd * sim_to_user - (1 - lambd) * sim_to_selected
+        scores = np.where(self.alive, scores, -np.inf)
+
+        # shortlist yang hampir seri, lalu skor float64 yang menentukan
+        best_idx = np.flatnonzero(scores >= scores.max() - SCORE_TOL)
+        if len(best_idx) > 1:
+            exact = self._exact_scores(best_idx, user_pref, lambd)
+            best_idx = best_idx[exact == exact.max()]
+        best = int(best_idx[np.argmin(self.rank[best_idx])]) if len(best_idx) > 1 else int(best_idx[0])
+        return self.take(best)
+
+    def take(self, index: int) -> int:
+        """Tandai kandidat `index` sebagai terpilih tanpa scoring (mis. resep
+        pertama yang sudah ditampilkan sebelum pool selesai di-hydrate)."""
+        if not self.alive[index]:
+            raise ValueError(f"candidate {index} already picked")
+        if self._pending is not None:
+            last = self.matrix[self._pending] * self.inv_norms[self._pending]
+            np.maximum(self.max_sim_selected, self.matrix.matmul(last) * self.inv_norms,
+                       out=self.max_sim_selected)
+        self.alive[index] = False
+        self.picked.append(index)
+        self._pending = index
+        return index
+
+    def recycle(self):
+        """Semua kandidat sudah dipilih: jadikan item terpilih kandidat lagi,
+        dengan urutan sesuai urutan pemilihan."""
+        self.rank[self.picked] = np.arange(len(self.picked))
+        self.alive[self.picked] = True
+        self.max_sim_selected.fill(-np.inf)
+        self.picked = []
+        self._pending = None
@@ -1,9 +1,28 @@
 # pipeline/bm25_model.py
+import hashlib
+import json
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+
+import mmh3
+import numpy as np
 from pinecone_text.sparse import BM25Encoder
+from pinecone_text.sparse.bm25_tokenizer import BM25Tokenizer
 
 BASE_DIR = Path(__file__).resolve().parents[1]
-BM25_PATH = BASE_DIR / "pipeline" / "model" / "bm25_params.json"
+BM25_PATH = Path(os.getenv("BM25_PATH")) if os.getenv("BM25_PATH") else BASE_DIR / "pipeline" / "model" / "bm25_params.json"
+
+# field tokenizer di params BM25Encoder
+TOKENIZER_FIELDS = ("lower_case", "remove_punctuation", "remove_stopwords", "stem", "language")
+# batas memo token -> hash, supaya query aneh tidak bikin memory terus naik
+HASH_MEMO_SIZE = 200_000
+# query yang sama (mis. "ayam") tidak perlu di-tokenize ulang
+QUERY_MEMO_SIZE = 4096
+
 
 def load_bm25_model(strict: bool = False) -> BM25Encoder:
     bm25 = BM25Encoder(stem=False)
@@ -19,4 +38,290 @@ def load_bm25_model(strict: bool = False) -> BM25Encoder:
     except Exception as e:
         if strict:
             raise RuntimeError(f"Failed to load BM25 params at {BM25_PATH}") from e
-        return bm25
\ No newline at end of file
+        return bm25
+
+
+def compiled_paths(params_path) -> tuple[Path, Path]:
+    """Artifact compiled di sebelah file params: <nama>.vocab.npy + <nama>.meta.json."""
+    params_path = Path(params_path)
+    stem = params_path.with_suffix("")
+    return Path(f"{stem}.vocab.npy"), Path(f"{stem}.meta.json")
+
+
+def _file_sha256(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compile_bm25(params_path=BM25_PATH, write: bool = True) -> "CompiledBM25":
+    """Compile params JSON BM25Encoder jadi tabel vocab (term hash terurut + df)
+    yang bisa di-mmap, lalu return encoder-nya."""
+    with open(params_path, "r") as f:
+        params = json.load(f)
+
+    terms = np.asarray(params["doc_freq"]["indices"], dtype=np.uint32)
+    doc_freq = np.asarray(params["doc_freq"]["values"], dtype=np.float64)
+    order = np.argsort(terms, kind="stable")
+    vocab = np.empty(len(terms), dtype=[("term", "<u4"), ("df", "<f8")])
+    vocab["term"] = terms[order]
+    vocab["df"] = doc_freq[order]
+
+    meta = {key: params[key] for key in ("avgdl", "n_docs", "b", "k1", *TOKENIZER_FIELDS)}
+    meta["source_sha256"] = _file_sha256(params_path)
+
+    if write:
+        vocab_path, meta_path = compiled_paths(params_path)
+        # vocab dulu baru meta: meta yang cocok berarti vocab-nya sudah lengkap
+        _write_atomic(vocab_path, lambda f: np.save(f, vocab))
+        _write_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    return CompiledBM25(vocab, meta)
+
+
+def _write_atomic(path: Path, write):
+    """Tulis lewat file tmp unik di folder yang sama lalu os.replace, supaya
+    beberapa worker yang compile bersamaan tidak menulis ke file tmp yang sama."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_bm25_encoder(params_path=BM25_PATH, strict: bool = False):
+    """Encoder BM25 untuk query/ingestion: artifact compiled kalau ada dan masih
+    sesuai dengan params JSON (di-compile ulang kalau belum), fallback ke BM25Encoder."""
+    params_path = Path(params_path)
+    if not params_path.exists():
+        if strict:
+            raise FileNotFoundError(f"BM25 params not found: {params_path}")
+        return BM25Encoder(stem=False)
+
+    vocab_path, meta_path = compiled_paths(params_path)
+    try:
+        if vocab_path.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("source_sha256") == _file_sha256(params_path):
+                return CompiledBM25(np.load(vocab_path, mmap_mode="r"), meta)
+        try:
+            return compile_bm25(params_path)
+        except OSError:
+            # folder model read-only: compile di memory saja
+            return compile_bm25(params_path, write=False)
+    except Exception as e:
+        if strict:
+            raise RuntimeError(f"Failed to load BM25 params at {params_path}") from e
+        print(f"compiled BM25 unavailable ({e}), using BM25Encoder")
+        bm25 = BM25Encoder(stem=False)
+        bm25.load(str(params_path))
+        return bm25
+
+
+class CompiledBM25:
+    """Pengganti BM25Encoder (encode_queries / encode_documents) di atas vocab compiled.
+
+    df dicari dengan searchsorted di array term terurut (bisa mmap, tanpa parse
+    JSON dan tanpa dict python), hash token di-memo, dan batch query/dokumen
+    dihitung sekaligus. Hasilnya sama persis dengan BM25Encoder untuk params
+    yang sama.
+    """
+
+    def __init__(self, vocab: np.ndarray, meta: dict):
+        self.terms = vocab["term"]
+        self.doc_freq = vocab["df"]
+        self.avgdl = meta["avgdl"]
+        self.n_docs = meta["n_docs"]
+        self.b = meta["b"]
+        self.k1 = meta["k1"]
+        # sha256 params JSON asal, dipakai ingestion untuk tahu kapan sparse vector harus di-encode ulang
+        self.source_sha256 = meta.get("source_sha256")
+        self._tokenizer = BM25Tokenizer(**{key: meta[key] for key in TOKENIZER_FIELDS})
+        self._hash_memo: dict[str, int] = {}
+        self._query_terms = lru_cache(maxsize=QUERY_MEMO_SIZE)(self._terms)
+
+    def _hash(self, token: str) -> int:
+        h = self._hash_memo.get(token)
+        if h is None:
+            if len(self._hash_memo) >= HASH_MEMO_SIZE:
+                self._hash_memo.clear()
+            h = self._hash_memo[token] = mmh3.hash(token, signed=False)
+        return h
+
+    def _tf(self, text: str):
+        # urutan term = urutan kemunculan pertama, sama seperti BM25Encoder._tf
+        counts = Counter(self._hash(token) for token in self._tokenizer(text))
+        return list(counts.keys()), list(counts.values())
+
+    def _terms(self, text: str) -> tuple:
+        return tuple(self._tf(text)[0])
+
+    def _lookup_df(self, indices: np.ndarray) -> np.ndarray:
+        df = np.ones(len(indices), dtype=np.float64)
+        if len(self.terms) and len(indices):
+            pos = np.searchsorted(self.terms, indices)
+            pos = np.minimum(pos, len(self.terms) - 1)
+            found = self.terms[pos] == indices
+            df[found] = self.doc_freq[pos[found]]
+        return df
+
+    def encode_queries(self, texts):
+        if isinstance(texts, str):
+            return self._encode_queries([texts])[0]
+        if isinstance(texts, list):
+            return self._encode_queries(texts)
+        raise ValueError("texts must be a string or list of strings")
+
+    def _encode_queries(self, texts):
+        tfs = [self._query_terms(text) for text in texts]
+        # satu lookup df untuk semua query di batch
+        all_indices = np.fromiter((i for indices in tfs for i in indices), dtype=np.uint32,
+                                  count=sum(len(indices) for indices in tfs))
+        all_df = self._lookup_df(all_indices)
+
+        out = []
+        start = 0
+        for indices in tfs:
+            df = all_df[start:start + len(indices)]
+            start += len(indices)
+            # log dihitung per query supaya identik dengan BM25Encoder
+            idf = np.log((self.n_docs + 1) / (df + 0.5))
+            idf_norm = idf / idf.sum()
+            out.append({"indices": list(indices), "values": idf_norm.tolist()})
+        return out
+
+    def encode_documents(self, texts):
+        if isinstance(texts, str):
+            return self._encode_documents([texts])[0]
+        if isinstance(texts, list):
+            return self._encode_documents(texts)
+        raise ValueError("texts must be a string or list of strings")
+
+    def _encode_documents(self, texts):
+        tfs = [self._tf(text) for text in texts]
+        lengths = np.array([len(indices) for indices, _ in tfs], dtype=np.int64)
+        tf = np.fromiter((v for _, counts in tfs for v in counts), dtype=np.int64, count=int(lengths.sum()))
+        tf_sums = np.array([sum(counts) for _, counts in tfs], dtype=np.int64)
+
+        # normalisasi panjang dokumen untuk seluruh batch dalam satu operasi
+        norm = self.k1 * (1.0 - self.b + self.b * (tf_sums / self.avgdl))
+        values = tf / (np.repeat(norm, lengths) + tf)
+
+        out = []
+        start = 0
+        for (indices, _), n in zip(tfs, lengths):
+            out.append({"indices": indices, "values": values[start:start + n].tolist()})
+            start += n
+        return out
+
+
+# ---------- fitting ----------
+BM25_FIT_WORKERS = int(os.getenv("BM25_FIT_WORKERS")) if os.getenv("BM25_FIT_WORKERS") else (os.cpu_count() or 1)
+
+_worker_encoder = None
+
+
+class _NotText(Exception):
+    """Dokumen bukan string: BM25Encoder.fit gagal untuk seluruh corpus."""
+
+
+def _init_fit_worker(encoder_params: dict):
+    global _worker_encoder
+    _worker_encoder = BM25Encoder(**encoder_params)
+
+
+def _fit_file(args):
+    """Statistik BM25 satu file: (n_docs, sum_doc_len, doc_freq, errors).
+    doc_freq urut kemunculan pertama, sama seperti Counter di BM25Encoder.fit."""
+    file_path, column = args
+    n_docs = 0
+    sum_doc_len = 0
+    doc_freq = Counter()
+    errors = []
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        for item in data:
+            doc = item[column]
+            if not isinstance(doc, str):
+                raise _NotText("corpus must be a list of strings")
+            indices, tf = _worker_encoder._tf(doc)
+            if len(indices) == 0:
+                continue
+            n_docs += 1
+            sum_doc_len += sum(tf)
+            doc_freq.update(indices)
+    except _NotText as e:
+        errors.append(("fit", str(e)))
+    except FileNotFoundError:
+        errors.append(("read", f"Error: {file_path} not found. Please ensure the file exists in the correct directory."))
+    except json.JSONDecodeError:
+        errors.append(("read", f"Error: Could not decode JSON from {file_path}. The file might be malformed."))
+    except Exception as e:
+        errors.append(("read", f"An unexpected error occurred: {e}"))
+    return n_docs, sum_doc_len, doc_freq, errors
+
+
+def corpus_files(folder_path: str) -> list[str]:
+    # urutan dan filter sama dengan create_corpus di pinecone_setup
+    if not os.path.isdir(folder_path):
+        return []
+    return [folder_path + '/' + filename for filename in os.listdir(folder_path)
+            if len(filename.split('.')) == 2 and filename.split('.')[1] == 'json']
+
+
+def fit_bm25_parallel(folder_path: str, column: str = 'text', bm25: BM25Encoder = None,
+                      workers: int = BM25_FIT_WORKERS) -> BM25Encoder:
+    """Fit BM25 dari semua file json di folder tanpa menampung seluruh corpus.
+
+    Tiap file di-tokenize di process pool, hasil df per file digabung sesuai
+    urutan file, jadi params (termasuk urutan doc_freq) sama persis dengan
+    BM25Encoder.fit pada corpus dari create_corpus.
+    """
+    bm25 = bm25 or BM25Encoder(stem=False)
+    encoder_params = {
+        "b": bm25.b,
+        "k1": bm25.k1,
+        **{key: getattr(bm25._tokenizer, key) for key in TOKENIZER_FIELDS},
+    }
+    files = corpus_files(folder_path)
+
+    n_docs = 0
+    sum_doc_len = 0
+    doc_freq = Counter()
+    fit_error = None
+    tasks = [(path, column) for path in files]
+    if workers <= 1 or len(files) <= 1:
+        _init_fit_worker(encoder_params)
+        results = map(_fit_file, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_fit_worker,
+                                   initargs=(encoder_params,))
+        # map menjaga urutan file
+        results = pool.map(_fit_file, tasks)
+    try:
+        for file_docs, file_len, file_df, errors in results:
+            n_docs += file_docs
+            sum_doc_len += file_len
+            doc_freq.update(file_df)
+            for kind, message in errors:
+                if kind == "fit":
+                    fit_error = fit_error or message
+                else:
+                    print(message)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print("corpus created successfully")
+    if fit_error:
+        raise ValueError(fit_error)
+
+    bm25.doc_freq = dict(doc_freq)
+    bm25.n_docs = n_docs
+    bm25.avgdl = sum_doc_len / n_docs
+    return bm25
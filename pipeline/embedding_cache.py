@@ -0,0 +1,183 @@
+# pipeline/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or str(BASE_DIR / "pipeline" / "cache" / "embeddings.sqlite")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB")) if os.getenv("EMBED_CACHE_MAX_MB") else 512
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS")) if os.getenv("EMBED_CACHE_MEMORY_ITEMS") else 2048
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") not in ("0", "false", "False")
+
+
+def normalize_text(text: str) -> str:
+    """NFC + rapikan whitespace, supaya text yang sama dapat key yang sama."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, dim: int, text: str) -> str:
+    raw = f"{model}\x00{dim}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache embedding dua tingkat: LRU di memory, SQLite di disk.
+
+    Key = sha256(model + dim + normalized text), value disimpan sebagai blob
+    float32. Disk dibatasi `max_bytes`; kalau lewat, entry yang paling lama
+    tidak diakses dihapus duluan.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_bytes: int = int(EMBED_CACHE_MAX_MB * 1024 * 1024),
+                 memory_items: int = EMBED_CACHE_MEMORY_ITEMS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+            self._disk_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, dim: int, texts: list[str]) -> list[np.ndarray | None]:
+        """Ambil embedding dari cache, None untuk yang belum ada."""
+        keys = [cache_key(model, dim, t) for t in texts]
+        out: list[np.ndarray | None] = [None] * len(keys)
+        with self._lock:
+            pending = {}
+            for i, key in enumerate(keys):
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    out[i] = vec
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            if pending:
+                db = self._db()
+                found = {}
+                pending_keys = list(pending)
+                for start in range(0, len(pending_keys), 500):
+                    chunk = pending_keys[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    for key, vec_dim, blob in db.execute(
+                            f"SELECT key, dim, vector FROM embeddings WHERE key IN ({marks})", chunk):
+                        if vec_dim == dim:
+                            found[key] = np.frombuffer(blob, dtype=np.float32)
+                if found:
+                    now = time.time()
+                    db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                                   [(now, key) for key in found])
+                    db.commit()
+                for key, idxs in pending.items():
+                    vec = found.get(key)
+                    if vec is None:
+                        self.misses += len(idxs)
+                        continue
+                    self.disk_hits += len(idxs)
+                    self._remember(key, vec)
+                    for i in idxs:
+                        out[i] = vec
+        return out
+
+    def put_many(self, model: str, dim: int, texts: list[str], vectors: list):
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                if vec is None:
+                    continue
+                key = cache_key(model, dim, text)
+                arr = np.asarray(vec, dtype=np.float32)
+                self._remember(key, arr)
+                rows.append((key, dim, arr.tobytes(), now))
+            if not rows:
+                return
+            db = self._db()
+            db.executemany("INSERT OR REPLACE INTO embeddings(key, dim, vector, last_access) VALUES (?, ?, ?, ?)", rows)
+            db.commit()
+            # perkiraan (key yang di-replace ikut terhitung), dihitung ulang saat evict
+            self._disk_bytes += sum(len(r[2]) for r in rows)
+            if self._disk_bytes > self.max_bytes:
+                self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self._disk_bytes = total
+        if total <= self.max_bytes:
+            return
+        # hapus yang paling lama tidak diakses sampai di bawah 90% limit
+        target = int(self.max_bytes * 0.9)
+        removed = []
+        for key, size in db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access ASC").fetchall():
+            if total <= target:
+                break
+            removed.append((key,))
+            total -= size
+        db.executemany("DELETE FROM embeddings WHERE key = ?", removed)
+        db.commit()
+        self._disk_bytes = total
+        for (key,) in removed:
+            self._memory.pop(key, None)
+        self.evictions += len(removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            db.execute("DELETE FROM embeddings")
+            db.commit()
+            self._disk_bytes = 0
@@ -2,7 +2,14 @@
 import os
 from dotenv import load_dotenv
 from pinecone_text.sparse import BM25Encoder
+import asyncio
+import time
+import numpy as np
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from pipeline.embedding_cache import EmbeddingCache, EMBED_CACHE_ENABLED
+from pipeline.resources import lazy
 
 load_dotenv()
 
@@ -10,44 +17,204 @@ SILICONFLOW_URL_EMBEDDING = os.getenv("SILICONFLOW_URL_EMBEDDING")
 SILICONFLOW_API_KEY = os.getenv("SILICONFLOW_API_KEY")
 EMBED_DIM = int(os.getenv("EMBED_DIM")) if os.getenv("EMBED_DIM") else 1024
 
-if not SILICONFLOW_URL_EMBEDDING:
-    raise RuntimeError("SILICONFLOW_URL_EMBEDDING is not set")
-if not SILICONFLOW_API_KEY:
-    raise RuntimeError("SILICONFLOW_API_KEY is not set")
+EMBED_MODEL = os.getenv("EMBED_MODEL") or "Qwen/Qwen3-Embedding-8B"
+# jumlah text per request ke provider
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE")) if os.getenv("EMBED_BATCH_SIZE") else 32
+EMBED_MAX_RETRIES = 4
+EMBED_TIMEOUT = 60
 
-headers = {
-    "Authorization": f"Bearer {SILICONFLOW_API_KEY}",
-    "Content-Type": "application/json",
-}
 
-def get_dense_embeddings(text: str, dim_size: int = EMBED_DIM) -> list[float]:
-    dim = dim_size or EMBED_DIM or 1024
-    payload = {
-        "model": "Qwen/Qwen3-Embedding-8B",
-        "input": text,
+
+def _headers(url: str, api_key: str) -> dict:
+    # dicek saat client dibuat (pertama kali embed), bukan saat import
+    if not url:
+        raise RuntimeError("SILICONFLOW_URL_EMBEDDING is not set")
+    if not api_key:
+        raise RuntimeError("SILICONFLOW_API_KEY is not set")
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+# status yang masih layak di-retry
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _build_payload(model: str, inputs: list[str], dim: int) -> dict:
+    return {
+        "model": model,
+        "input": inputs,
         "encoding_format": "float",
         "dimensions": dim,
     }
 
-    try:
-        response = requests.post(
-            SILICONFLOW_URL_EMBEDDING,
-            json=payload,
-            headers=headers
-        )
-        response.raise_for_status()
 
-        data = response.json()
+def _parse_embeddings(data: dict, n_inputs: int) -> list[list[float]]:
+    # Validasi struktur response
+    if "data" not in data or not data["data"]:
+        raise ValueError("Response JSON tidak memiliki field 'data' atau kosong.")
+    if len(data["data"]) != n_inputs:
+        raise ValueError(f"Jumlah embedding ({len(data['data'])}) tidak sama dengan input ({n_inputs}).")
+
+    items = sorted(data["data"], key=lambda d: d.get("index", 0))
+    for item in items:
+        if "embedding" not in item:
+            raise ValueError("Field 'embedding' tidak ditemukan di dalam 'data'.")
+    return [item["embedding"] for item in items]
+
+
+class EmbeddingClient:
+    """HTTP client embedding dengan connection pool persisten dan batching."""
+
+    def __init__(self, url: str = SILICONFLOW_URL_EMBEDDING, model: str = EMBED_MODEL,
+                 batch_size: int = EMBED_BATCH_SIZE, max_retries: int = EMBED_MAX_RETRIES,
+                 timeout: float = EMBED_TIMEOUT, pool_size: int = 10, api_key: str = SILICONFLOW_API_KEY):
+        headers = _headers(url, api_key)
+        self.url = url
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_batch(self, inputs: list[str], dim: int) -> list[list[float]]:
+        payload = _build_payload(self.model, inputs, dim)
+
+        backoff = 1.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    time.sleep(backoff)
+                    backoff *= 1.8
+                    continue
+                response.raise_for_status()
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(backoff)
+                backoff *= 1.8
+
+        return _parse_embeddings(response.json(), len(inputs))
+
+    def embed(self, texts: list[str], dim: int = EMBED_DIM) -> list[list[float] | None]:
+        """Embed list of texts per batch. Batch yang gagal diisi None."""
+        out: list[list[float] | None] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            try:
+                out.extend(self.post_batch(batch, dim))
+            except requests.exceptions.RequestException as e:
+                print(f"Error HTTP: {e}")
+                out.extend([None] * len(batch))
+            except ValueError as e:
+                print(f"Error data: {e}")
+                out.extend([None] * len(batch))
+        return out
+
+
+class AsyncEmbeddingClient:
+    """Versi asyncio dari EmbeddingClient (httpx), batch dikirim bersamaan."""
+
+    def __init__(self, url: str = SILICONFLOW_URL_EMBEDDING, model: str = EMBED_MODEL,
+                 batch_size: int = EMBED_BATCH_SIZE, max_retries: int = EMBED_MAX_RETRIES,
+                 timeout: float = EMBED_TIMEOUT, pool_size: int = 10, max_concurrency: int = 4,
+                 api_key: str = SILICONFLOW_API_KEY):
+        self.headers = _headers(url, api_key)
+        self.url = url
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._loop = None
 
-        # Validasi struktur response
-        if "data" not in data or not data["data"]:
-            raise ValueError("Response JSON tidak memiliki field 'data' atau kosong.")
+    def _http(self) -> httpx.AsyncClient:
+        # dibuat saat pertama dipakai (per event loop) supaya terikat ke loop yang jalan
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._client
 
-        if "embedding" not in data["data"][0]:
-            raise ValueError("Field 'embedding' tidak ditemukan di dalam 'data[0]'.")
+    async def post_batch(self, inputs: list[str], dim: int) -> list[list[float]]:
+        payload = _build_payload(self.model, inputs, dim)
 
-        return data["data"][0]["embedding"]
+        backoff = 1.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._http().post(self.url, json=payload)
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    await asyncio.sleep(backoff)
+                    backoff *= 1.8
+                    continue
+                response.raise_for_status()
+                break
+            except (httpx.TransportError, httpx.TimeoutException):
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff)
+                backoff *= 1.8
 
+        return _parse_embeddings(response.json(), len(inputs))
+
+    async def embed(self, texts: list[str], dim: int = EMBED_DIM) -> list[list[float] | None]:
+        """Embed list of texts, beberapa batch jalan bersamaan. Batch yang gagal diisi None."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                try:
+                    return await self.post_batch(batch, dim)
+                except httpx.HTTPError as e:
+                    print(f"Error HTTP: {e}")
+                except ValueError as e:
+                    print(f"Error data: {e}")
+                return [None] * len(batch)
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(run(b) for b in batches))
+        return [vec for batch in results for vec in batch]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+# client dibuat saat embedding pertama, jadi import modul ini tidak butuh credential
+client = lazy("embedding_client", EmbeddingClient)
+async_client = lazy("async_embedding_client", AsyncEmbeddingClient)
+# cache embedding (memory + disk), dipakai untuk query maupun ingestion
+cache = EmbeddingCache() if EMBED_CACHE_ENABLED else None
+
+
+def get_dense_embeddings(text: str, dim_size: int = EMBED_DIM) -> list[float]:
+    dim = dim_size or EMBED_DIM or 1024
+    if cache is not None:
+        cached = cache.get_many(EMBED_MODEL, dim, [text])[0]
+        if cached is not None:
+            return cached.tolist()
+    try:
+        vec = client.get().post_batch([text], dim)[0]
+        if cache is not None:
+            cache.put_many(EMBED_MODEL, dim, [text], [vec])
+            # samakan presisi dengan hasil dari cache (float32)
+            return np.asarray(vec, dtype=np.float32).tolist()
+        return vec
     except requests.exceptions.RequestException as e:
         print(f"Error HTTP: {e}")
     except ValueError as e:
@@ -57,6 +224,44 @@ def get_dense_embeddings(text: str, dim_size: int = EMBED_DIM) -> list[float]:
 
     return None
 
+
+def get_dense_embeddings_batch(texts: list[str], dim_size: int = EMBED_DIM) -> list[list[float] | None]:
+    """Embed banyak text sekaligus, hasil urut sesuai input (None kalau batch-nya gagal).
+    Hanya text yang belum ada di cache yang dikirim ke provider."""
+    dim = dim_size or EMBED_DIM or 1024
+    texts = list(texts)
+    if cache is None:
+        return client.get().embed(texts, dim)
+
+    cached = cache.get_many(EMBED_MODEL, dim, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    fetched = dict(zip(missing, client.get().embed(missing, dim))) if missing else {}
+    if fetched:
+        cache.put_many(EMBED_MODEL, dim, list(fetched), list(fetched.values()))
+        # samakan presisi dengan hasil dari cache (float32)
+        cached = [v if v is not None else fetched.get(t) for t, v in zip(texts, cached)]
+    return [np.asarray(v, dtype=np.float32).tolist() if v is not None else None for v in cached]
+
+async def get_dense_embeddings_async(text: str, dim_size: int = EMBED_DIM) -> list[float]:
+    return (await get_dense_embeddings_batch_async([text], dim_size))[0]
+
+
+async def get_dense_embeddings_batch_async(texts: list[str], dim_size: int = EMBED_DIM) -> list[list[float] | None]:
+    """Versi async dari get_dense_embeddings_batch."""
+    dim = dim_size or EMBED_DIM or 1024
+    texts = list(texts)
+    if cache is None:
+        return await async_client.get().embed(texts, dim)
+
+    # cache SQLite (baca, update, commit, lock) di thread supaya event loop tidak ikut blocking
+    cached = await asyncio.to_thread(cache.get_many, EMBED_MODEL, dim, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    fetched = dict(zip(missing, await async_client.get().embed(missing, dim))) if missing else {}
+    if fetched:
+        await asyncio.to_thread(cache.put_many, EMBED_MODEL, dim, list(fetched), list(fetched.values()))
+        cached = [v if v is not None else fetched.get(t) for t, v in zip(texts, cached)]
+    return [np.asarray(v, dtype=np.float32).tolist() if v is not None else None for v in cached]
+
 def get_sparse_embeddings(text: str, bm25_model: BM25Encoder, query_type: str = "search"):
     if query_type == "upsert":
         return bm25_model.encode_documents(text)
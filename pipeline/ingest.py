@@ -0,0 +1,396 @@
+# pipeline/ingest.py
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from mapping import FINAL_LAMBDA, blend_vectors
+from pipeline.get_embedding import EMBED_DIM, get_dense_embeddings_batch
+from pipeline.query_cache import bump_index_version
+from pipeline.recipe_store import iter_recipes
+from pipeline.vector_index import VectorIndex, coarse_namespace, truncate_vectors
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+MANIFEST_DIR = BASE_DIR / "pipeline" / "store"
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE")) if os.getenv("INGEST_BATCH_SIZE") else 100
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS")) if os.getenv("INGEST_WORKERS") else 4
+# FINAL_LAMBDAS untuk build final vector beberapa lambda sekaligus (default FINAL_LAMBDA, lihat mapping.py)
+FINAL_LAMBDAS = tuple(float(x) for x in os.getenv("FINAL_LAMBDAS", "").split(",") if x.strip()) or (FINAL_LAMBDA,)
+
+
+def batched(iterable, size):
+    """Seperti chunked, tapi untuk generator."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """State index per namespace: id -> content hash text yang sudah di-upsert
+    (file jsonl, append-only).
+
+    Baris {"ids": {id: hash}} ditulis tiap checkpoint, {"deleted": [...]} saat
+    resep dihapus. Dipakai untuk resume dan untuk incremental re-index.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        state = {}
+        if not self.path.exists():
+            return state
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # baris terakhir bisa terpotong kalau proses mati saat menulis
+                    continue
+                ids = record.get("ids", {})
+                if isinstance(ids, list):
+                    # format lama tanpa hash: dianggap berubah supaya di-embed ulang sekali
+                    ids = dict.fromkeys(ids)
+                state.update(ids)
+                for _id in record.get("deleted", []):
+                    state.pop(_id, None)
+        return state
+
+    def _write(self, record: dict, mode="a"):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, mode, encoding="utf-8") as f:
+                f.write(json.dumps({**record, "ts": time.time()}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, hashes: dict):
+        if hashes:
+            self._write({"ids": dict(hashes)})
+
+    def append_deleted(self, ids):
+        if ids:
+            self._write({"deleted": list(ids)})
+
+    def compact(self, state: dict):
+        """Tulis ulang manifest jadi satu snapshot supaya file tidak terus membesar."""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"ids": state, "ts": time.time()}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def reset(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+def manifest_for(namespace, column) -> IngestManifest:
+    return IngestManifest(MANIFEST_DIR / f"ingest_{namespace or 'default'}_{column}.jsonl")
+
+
+def _embed_batch(batch, bm25_model, column):
+    texts = [item[column] for item in batch]
+    dense_values = get_dense_embeddings_batch(texts, EMBED_DIM)
+    sparse_values = bm25_model.encode_documents(texts)
+
+    dense_vectors, sparse_vectors, ok_ids = [], [], []
+    for item, values, sparse_vals in zip(batch, dense_values, sparse_values):
+        if values is None:
+            # gagal embed: jangan di-checkpoint supaya diulang saat re-run
+            continue
+        dense_vectors.append({"id": item["id"], "values": values})
+        if sparse_vals and sparse_vals.get("indices") and sparse_vals.get("values"):
+            sparse_vectors.append({"id": item["id"], "sparse_values": sparse_vals})
+        ok_ids.append(item["id"])
+    return dense_vectors, sparse_vectors, ok_ids
+
+
+def ingest_recipes(vector_index: VectorIndex, bm25_model, folder_path, namespace, column='text',
+                   batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS, checkpoint_every=10,
+                   manifest: IngestManifest = None):
+    """Streaming, incremental ingestion: baca resep per batch, embed beberapa
+    batch bersamaan, upsert dense dan sparse paralel, lalu checkpoint hash
+    text yang selesai.
+
+    Hanya resep baru atau yang text `column`-nya berubah (hash beda) yang
+    di-embed dan di-upsert; resep yang sudah tidak ada di folder dihapus dari
+    index. Jadi re-run setelah crash otomatis resume, dan re-index harian
+    sebanding dengan diff, bukan seluruh corpus.
+
+    Kalau `bm25_model` punya `source_sha256` (CompiledBM25), sidik params BM25
+    ikut di hash, jadi refit BM25 (avgdl/df baru) membuat semua resep di-encode
+    ulang dan sparse vector lama tidak tercampur dengan params baru.
+
+    Return: dict ringkasan (jumlah resep, waktu, throughput).
+    """
+    manifest = manifest or manifest_for(namespace, column)
+    bm25_fingerprint = getattr(bm25_model, "source_sha256", None)
+    state = manifest.load()
+    if state:
+        print(f"index state: {len(state)} recipes already ingested")
+
+    seen = set()
+    hashes = {}
+    read_errors = []
+    n_unchanged = 0
+
+    def changed_recipes():
+        nonlocal n_unchanged
+        for item in iter_recipes(folder_path, errors=read_errors):
+            text = item.get(column)
+            if not text:
+                continue
+            _id = item["id"]
+            seen.add(_id)
+            h = content_hash(f"{bm25_fingerprint}:{text}" if bm25_fingerprint else text)
+            if state.get(_id) == h:
+                n_unchanged += 1
+                continue
+            hashes[_id] = h
+            yield item
+
+    start = time.perf_counter()
+    n_ingested = 0
+    n_failed = 0
+    n_batches = 0
+    to_checkpoint = {}
+
+    def checkpoint(final=False):
+        # manifest hanya di-checkpoint setelah upsert-nya tersimpan (local index: saat save)
+        if final:
+            vector_index.save()
+        elif not vector_index.checkpoint():
+            return
+        manifest.append(to_checkpoint)
+        state.update(to_checkpoint)
+        to_checkpoint.clear()
+
+    def process(batch):
+        dense_vectors, sparse_vectors, ok_ids = _embed_batch(batch, bm25_model, column)
+        futures = [upsert_pool.submit(vector_index.upsert_dense, dense_vectors, namespace)]
+        if sparse_vectors:
+            futures.append(upsert_pool.submit(vector_index.upsert_sparse, sparse_vectors, namespace))
+        for f in futures:
+            f.result()
+        return ok_ids
+
+    with ThreadPoolExecutor(max_workers=workers) as embed_pool, \
+            ThreadPoolExecutor(max_workers=workers * 2) as upsert_pool:
+        in_flight = {}
+        batches = batched(changed_recipes(), batch_size)
+
+        def drain(return_when):
+            nonlocal n_ingested, n_failed, n_batches
+            finished, _ = wait(in_flight, return_when=return_when)
+            for fut in finished:
+                batch = in_flight.pop(fut)
+                try:
+                    ok_ids = fut.result()
+                except Exception as e:
+                    print(f"batch failed: {e}")
+                    n_failed += len(batch)
+                    continue
+                n_batches += 1
+                n_ingested += len(ok_ids)
+                n_failed += len(batch) - len(ok_ids)
+                to_checkpoint.update({_id: hashes[_id] for _id in ok_ids})
+                if n_batches % checkpoint_every == 0:
+                    checkpoint()
+                    elapsed = time.perf_counter() - start
+                    print(f"{n_ingested} recipes ingested, {n_ingested / elapsed:.1f} recipes/s")
+
+        for batch in batches:
+            in_flight[embed_pool.submit(process, batch)] = batch
+            # batasi batch yang sedang jalan supaya corpus tidak dibaca sekaligus
+            if len(in_flight) >= workers * 2:
+                drain(FIRST_COMPLETED)
+        while in_flight:
+            drain(FIRST_COMPLETED)
+
+    # resep yang sudah hilang dari folder -> hapus dari index
+    removed = [_id for _id in state if _id not in seen]
+    if removed and read_errors:
+        # file yang gagal dibaca bukan berarti resepnya dihapus
+        print(f"skip deleting {len(removed)} recipes, failed to read: {read_errors}")
+        removed = []
+    for batch in batched(removed, 1000):
+        vector_index.delete(batch, namespace)
+    checkpoint(final=True)
+    if removed:
+        manifest.append_deleted(removed)
+        for _id in removed:
+            state.pop(_id, None)
+    manifest.compact(state)
+    if n_ingested or removed:
+        # hasil query yang di-cache sudah basi
+        bump_index_version()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "namespace": namespace,
+        "ingested": n_ingested,
+        "unchanged": n_unchanged,
+        "deleted": len(removed),
+        "failed": n_failed,
+        "seconds": elapsed,
+        "recipes_per_s": n_ingested / elapsed if elapsed else 0.0,
+    }
+    print(f"ingestion done for {namespace}: {n_ingested} recipes in {elapsed:.1f}s "
+          f"({summary['recipes_per_s']:.1f} recipes/s), {n_unchanged} unchanged, "
+          f"{len(removed)} deleted, {n_failed} failed")
+    return summary
+
+
+def final_namespace(lambd: float) -> str:
+    """Namespace final vector untuk satu nilai lambda, mis. final-0.5."""
+    return f"final-{lambd:g}"
+
+
+def _build_derived(target_index: VectorIndex, source: dict, fetch, targets: dict, kind: str,
+                   batch_size=INGEST_BATCH_SIZE, checkpoint_every=10):
+    """Isi namespace turunan (vector yang dihitung dari vector lain di index).
+
+    source: id -> hash vector sumber; fetch(ids) -> (list matrix sumber, found mask);
+    targets: namespace -> transform(*matrix sumber) -> matrix hasil.
+    Incremental lewat manifest per namespace target (`kind` = nama manifest),
+    resep yang sudah tidak ada di `source` dihapus.
+    """
+    start = time.perf_counter()
+    manifests = {ns: manifest_for(ns, kind) for ns in targets}
+    states = {ns: manifest.load() for ns, manifest in manifests.items()}
+    changed = {ns: {_id for _id, h in source.items() if state.get(_id) != h} for ns, state in states.items()}
+    todo = sorted(set().union(*changed.values()))
+
+    n_built = {ns: 0 for ns in targets}
+    n_missing = 0
+    to_checkpoint = {ns: {} for ns in targets}
+
+    def checkpoint(final=False):
+        if final:
+            target_index.save()
+        elif not target_index.checkpoint():
+            return
+        for ns, hashes in to_checkpoint.items():
+            manifests[ns].append(hashes)
+            states[ns].update(hashes)
+            hashes.clear()
+
+    for n_batches, batch in enumerate(batched(todo, batch_size), 1):
+        matrices, found = fetch(batch)
+        n_missing += int((~found).sum())
+        ids = [_id for _id, ok in zip(batch, found) if ok]
+        if ids:
+            matrices = [m[found] for m in matrices]
+            for ns, transform in targets.items():
+                rows = [i for i, _id in enumerate(ids) if _id in changed[ns]]
+                if not rows:
+                    continue
+                out = transform(*(m[rows] for m in matrices))
+                target_index.upsert_dense([{"id": ids[i], "values": vec.tolist()} for i, vec in zip(rows, out)], ns)
+                to_checkpoint[ns].update({ids[i]: source[ids[i]] for i in rows})
+                n_built[ns] += len(rows)
+        if n_batches % checkpoint_every == 0:
+            checkpoint()
+    checkpoint(final=True)
+
+    n_deleted = 0
+    removed = {ns: [_id for _id in state if _id not in source] for ns, state in states.items()}
+    for ns, ids in removed.items():
+        for batch in batched(ids, 1000):
+            target_index.delete(batch, ns)
+    if any(removed.values()):
+        target_index.save()
+    for ns in targets:
+        if removed[ns]:
+            manifests[ns].append_deleted(removed[ns])
+            for _id in removed[ns]:
+                states[ns].pop(_id, None)
+            n_deleted += len(removed[ns])
+        manifests[ns].compact(states[ns])
+    if any(n_built.values()) or n_deleted:
+        bump_index_version()
+
+    elapsed = time.perf_counter() - start
+    print(f"{kind} vectors done in {elapsed:.1f}s: "
+          + ", ".join(f"{ns} {n} built" for ns, n in n_built.items())
+          + f", {n_deleted} deleted, {n_missing} missing source vectors")
+    return {"built": n_built, "deleted": n_deleted, "missing": n_missing, "seconds": elapsed}
+
+
+def _source_state(namespace, column) -> dict:
+    """State manifest namespace sumber untuk namespace turunan; error kalau kosong,
+    supaya namespace turunan tidak diam-diam di-build dari nol resep."""
+    manifest = manifest_for(namespace, column)
+    state = manifest.load()
+    if not state:
+        raise RuntimeError(f"namespace {namespace!r} has no ingested recipes ({manifest.path} is empty "
+                           f"or missing), run ingest_recipes(..., namespace={namespace!r}, column={column!r}) first")
+    return state
+
+
+def build_final_vectors(vector_index: VectorIndex, namespace_ingredients, namespace_all, lambdas=(FINAL_LAMBDA,),
+                        column_ingredients='text', column_all='all_text', batch_size=INGEST_BATCH_SIZE,
+                        checkpoint_every=10):
+    """Hitung final vector (blend vector bahan + vector all-text) sekali saat
+    ingestion dan simpan di namespace sendiri per lambda (`final_namespace`),
+    jadi saat query cukup satu fetch dan tidak ada blending per request.
+
+    Dijalankan setelah kedua namespace selesai di-ingest. Incremental seperti
+    ingest_recipes: hanya resep yang text bahan / all-text-nya berubah yang
+    dihitung ulang, resep yang sudah tidak ada dihapus.
+    """
+    ingredients_state = _source_state(namespace_ingredients, column_ingredients)
+    all_state = _source_state(namespace_all, column_all)
+    # hash gabungan: berubah kalau salah satu vector sumber berubah
+    source = {_id: content_hash(f"{h}:{all_state[_id]}")
+              for _id, h in ingredients_state.items() if _id in all_state}
+    if not source:
+        raise RuntimeError(f"no recipe is ingested in both {namespace_ingredients!r} and {namespace_all!r}")
+
+    def fetch(ids):
+        ingredients, found_ingredients = vector_index.fetch_matrix(ids, namespace_ingredients)
+        all_text, found_all = vector_index.fetch_matrix(ids, namespace_all)
+        return (ingredients, all_text), found_ingredients & found_all
+
+    targets = {final_namespace(lambd): (lambda ing, all_text, lambd=lambd: blend_vectors(ing, all_text, lambd))
+               for lambd in lambdas}
+    return _build_derived(vector_index, source, fetch, targets, "final",
+                          batch_size=batch_size, checkpoint_every=checkpoint_every)
+
+
+def build_coarse_vectors(vector_index: VectorIndex, namespace, dim: int, column='text',
+                         coarse_index: VectorIndex = None, batch_size=INGEST_BATCH_SIZE, checkpoint_every=10):
+    """Index Matryoshka berdimensi kecil untuk two-stage search: `dim` elemen
+    pertama vector di `namespace`, dinormalisasi ulang, disimpan di
+    `coarse_namespace(namespace, dim)`. Tidak perlu embed ulang.
+
+    coarse_index: index tujuan kalau dimensinya beda dengan index utama
+    (Pinecone: satu index satu dimensi), default `vector_index`.
+    """
+    # error kalau `namespace` belum di-ingest, jangan build index coarse kosong
+    source = _source_state(namespace, column)
+
+    def fetch(ids):
+        matrix, found = vector_index.fetch_matrix(ids, namespace)
+        return (matrix,), found
+
+    targets = {coarse_namespace(namespace, dim): lambda matrix: truncate_vectors(matrix, dim)}
+    return _build_derived(coarse_index or vector_index, source, fetch, targets, "coarse",
+                          batch_size=batch_size, checkpoint_every=checkpoint_every)
@@ -1,14 +1,21 @@
 # pipeline/pinecone_setup.py
 import json
 import os
+import sys
 import asyncio
 from pinecone.grpc import PineconeGRPC as Pinecone
 from dotenv import load_dotenv
 from pinecone_text.sparse import BM25Encoder
 from pinecone import ServerlessSpec
-from get_embedding import get_dense_embeddings
 from pathlib import Path
 
+# supaya `python pipeline/pinecone_setup.py` bisa import package pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pipeline.get_embedding import get_dense_embeddings_batch
+from pipeline.vector_index import VECTOR_BACKEND, PineconeVectorIndex, get_vector_index
+from pipeline.ingest import FINAL_LAMBDAS, build_coarse_vectors, build_final_vectors, ingest_recipes
+from pipeline.bm25_model import compile_bm25, fit_bm25_parallel
+
 # load env
 load_dotenv()
 PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
@@ -17,11 +24,14 @@ NAME_PINECONE_SPARSE = os.getenv('NAME_PINECONE_SPARSE')
 NAMESPACE = os.getenv('NAMESPACE')
 NAMESPACE2 = os.getenv('NAMESPACE2')
 EMBED_DIM = int(os.getenv('EMBED_DIM')) if os.getenv('EMBED_DIM') else 1024
-
-# config
-pc = Pinecone(api_key=PINECONE_API_KEY)
-
-def create_index():
+# index Matryoshka untuk two-stage dense search (0 = tidak dibuat)
+COARSE_DIM = int(os.getenv('COARSE_DIM')) if os.getenv('COARSE_DIM') else 0
+NAME_PINECONE_COARSE = os.getenv('NAME_PINECONE_COARSE')
+# BM25 hanya di-fit ulang kalau params belum ada atau BM25_REFIT=1; refit mengubah avgdl/df
+# sehingga semua sparse vector di-encode ulang (lihat ingest_recipes)
+BM25_REFIT = os.getenv('BM25_REFIT', '0') not in ('0', 'false', 'False')
+
+def create_index(pc):
     if not pc.has_index(NAME_PINECONE_DENSE):
         print("create dense index")
         pc.create_index(
@@ -35,6 +45,19 @@ def create_index():
             )
         )
 
+    if COARSE_DIM and not pc.has_index(NAME_PINECONE_COARSE):
+        print("create coarse dense index")
+        pc.create_index(
+            name=NAME_PINECONE_COARSE,
+            vector_type="dense",
+            dimension=COARSE_DIM,
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud="aws",
+                region="us-east-1"
+            )
+        )
+
     if not pc.has_index(NAME_PINECONE_SPARSE):
         print("create sparse index")
         pc.create_index(
@@ -53,18 +76,20 @@ def generate_embedding(path_files, bm25_model, column='text'):
             data = json.load(file)
             dense_vectors = []
             sparse_vectors = []
-            for item in data:
-                # get dense embedding
+            # get dense embedding per batch (satu request untuk banyak resep)
+            texts = [item[column] for item in data]
+            dense_values = get_dense_embeddings_batch(texts, EMBED_DIM)
+            # sparse juga sekaligus satu batch
+            sparse_values = bm25_model.encode_documents(texts)
+            for item, values, sparse_vals in zip(data, dense_values, sparse_values):
                 dense_item = {
                     "id": item['id'], 
-                    "values": get_dense_embeddings(item[column], EMBED_DIM), 
+                    "values": values, 
                     # "metadata": {key: value for key, value in item.items() if key in {"category"}}
                     # "metadata": item['all_text']
                 }
                 if dense_item["values"] is not None:
                     dense_vectors.append(dense_item)
-                # get sparse embedding
-                sparse_vals = bm25_model.encode_documents([item[column]])[0]
                 if sparse_vals and sparse_vals.get("indices") and sparse_vals.get("values"):
                     sparse_item = {
                         "id": item["id"],
@@ -115,16 +140,25 @@ def create_corpus(corpus, folder_path, column='text'):
 def create_corpus_train_bm25_model(bm25, folder_path, column='text'):
     # folder_path juga dibuat absolut
     folder_path = (BASE_DIR / folder_path).resolve()
-    bm25_corpus = []
-    create_corpus(bm25_corpus, str(folder_path), column)
-    bm25.fit(bm25_corpus)
+    # tokenize per file di process pool, hasil sama dengan create_corpus + bm25.fit
+    fit_bm25_parallel(str(folder_path), column, bm25)
     # ingredient text only
     if(column == 'text'):
-        bm25.dump(str(BM25_PATH))
+        params_path = BM25_PATH
     else: # all text
-        bm25.dump(str(BM25_PATH2))
+        params_path = BM25_PATH2
+    bm25.dump(str(params_path))
 
     print("bm25 model successfully loaded")
+    return params_path
+
+def bm25_params(folder_path, column='text'):
+    # run incremental pakai params yang sudah ada, supaya resep lama dan baru di-encode dengan avgdl/df yang sama
+    params_path = BM25_PATH if column == 'text' else BM25_PATH2
+    if params_path.exists() and not BM25_REFIT:
+        print(f"using existing bm25 params {params_path} (set BM25_REFIT=1 to refit)")
+        return params_path
+    return create_corpus_train_bm25_model(BM25Encoder(stem=False), folder_path, column)
 
 # helper to chunk vector
 def chunked(seq, size):
@@ -132,71 +166,52 @@ def chunked(seq, size):
         yield seq[i:i+size]
 
 def main():
-    # create index (if not available)
-    create_index()
-    # get index vector db
-    index_dense = pc.Index(name=NAME_PINECONE_DENSE)
-    index_sparse = pc.Index(name=NAME_PINECONE_SPARSE)
+    if VECTOR_BACKEND == "local":
+        # local index (pipeline/index) tidak butuh Pinecone
+        index_dense = index_sparse = None
+    else:
+        # client Pinecone hanya dibuat untuk backend pinecone (local tidak butuh API key)
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        # create index (if not available)
+        create_index(pc)
+        # get index vector db
+        index_dense = pc.Index(name=NAME_PINECONE_DENSE)
+        index_sparse = pc.Index(name=NAME_PINECONE_SPARSE)
+    vector_index = get_vector_index(index_dense, index_sparse)
+    # local: namespace coarse di index yang sama
+    coarse_index = vector_index if VECTOR_BACKEND == "local" or not COARSE_DIM else \
+        PineconeVectorIndex(pc.Index(name=NAME_PINECONE_COARSE), None)
     # create corpus and train bm25 model
-    bm25 = BM25Encoder(stem=False)
-    # # create corpus for ingredient text only
-    # create_corpus_train_bm25_model(bm25, folder_path)
+    # create corpus for ingredient text only (BM25 yang dipakai query sparse ke NAMESPACE)
+    params_path_text = bm25_params(folder_path)
     
     # CREATE CORPUS FOR ALL TEXT
-    create_corpus_train_bm25_model(bm25, folder_path, 'all_text') 
+    params_path = bm25_params(folder_path, 'all_text')
+    # encoder compiled (hasil sama dengan BM25Encoder) untuk encode dokumen per batch
+    bm25_text = compile_bm25(params_path_text)
+    bm25 = compile_bm25(params_path)
     print("load bm25 model done")
 
-    # generate dense and sparse vector
-    if os.path.isdir(folder_path):
-        for filename in os.listdir(folder_path):
-            if len(filename.split('.')) == 2 and filename.split('.')[1] == 'json':
-                file_path=folder_path+'/'+filename
-                """
-                GENERATE EMBEDDING AND UPSERT FROM TEXT INGREDIENT ONLY
-                """
-                # # insert data dense
-                # dense_vectors, sparse_vectors = generate_embedding(file_path, bm25_model=bm25)
-                # print("generate dense and sparse vector done for: ", filename)
-                # # upsert dense per 100
-                # for idx, batch in enumerate(chunked(dense_vectors, 100)):
-                #     index_dense.upsert(
-                #         vectors=batch,
-                #         namespace=NAMESPACE
-                #     )
-                #     print(f"successfully insert {(idx+1)*100} data")
-                # print("upsert dense vector successfully for:", filename)
-
-                # # upsert sparse per 100
-                # for idx, batch in enumerate(chunked(sparse_vectors, 100)):
-                #     index_sparse.upsert(
-                #         vectors=batch,
-                #         namespace=NAMESPACE
-                #     )
-                #     print(f"successfully insert {(idx+1)*100} data")
-                # print("upsert sparse vector successfully for:", filename)
-                """
-                GENERATE EMBEDDING AND UPSERT FROM TITLE+INGREDIENT+STEP TEXT
-                """
-                # insert data dense
-                dense_vectors, sparse_vectors = generate_embedding(file_path, bm25_model=bm25, column='all_text')
-                print("(all_text) generate dense and sparse vector done for: ", filename)
-                # upsert dense per 100
-                for idx, batch in enumerate(chunked(dense_vectors, 100)):
-                    index_dense.upsert(
-                        vectors=batch,
-                        namespace=NAMESPACE2
-                    )
-                    print(f"successfully insert {(idx+1)*100} data")
-                print("(all_text) upsert dense vector successfully for:", filename)
-
-                # upsert sparse per 100
-                for idx, batch in enumerate(chunked(sparse_vectors, 100)):
-                    index_sparse.upsert(
-                        vectors=batch,
-                        namespace=NAMESPACE2
-                    )
-                    print(f"successfully insert {(idx+1)*100} data")
-                print("(all_text) upsert sparse vector successfully for:", filename)
+    # generate dense and sparse vector (streaming, paralel, resumable)
+    # incremental: namespace yang sudah di-ingest hanya mengerjakan resep baru / berubah
+    recipes_path = str((BASE_DIR / folder_path).resolve())
+    """
+    GENERATE EMBEDDING AND UPSERT FROM TEXT INGREDIENT ONLY
+    """
+    ingest_recipes(vector_index, bm25_text, recipes_path, namespace=NAMESPACE, column='text')
+    """
+    GENERATE EMBEDDING AND UPSERT FROM TITLE+INGREDIENT+STEP TEXT
+    """
+    ingest_recipes(vector_index, bm25, recipes_path, namespace=NAMESPACE2, column='all_text')
+    """
+    FINAL VECTOR (BLEND INGREDIENT + ALL TEXT) PER LAMBDA, DIPAKAI LEWAT NAMESPACE_FINAL
+    """
+    build_final_vectors(vector_index, NAMESPACE, NAMESPACE2, FINAL_LAMBDAS)
+    """
+    INDEX COARSE (COARSE_DIM) DARI VECTOR INGREDIENT, UNTUK TWO-STAGE DENSE SEARCH
+    """
+    if COARSE_DIM:
+        build_coarse_vectors(vector_index, NAMESPACE, COARSE_DIM, coarse_index=coarse_index)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+# pipeline/quantize.py
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DTYPES = ("float32", "float16", "int8")
+# representasi vector di pool sesi dan cache hasil query
+VECTOR_DTYPE = (os.getenv("VECTOR_DTYPE") or "float32").lower()
+# scoring di-dequantize per blok baris supaya tidak ada copy float32 satu matrix penuh
+BLOCK_ROWS = 4096
+
+
+def check_dtype(dtype: str) -> str:
+    dtype = (dtype or "float32").lower()
+    if dtype not in DTYPES:
+        raise ValueError(f"unknown vector dtype {dtype!r}, expected one of {DTYPES}")
+    return dtype
+
+
+class QuantizedMatrix:
+    """Matrix vector (baris = vector) yang disimpan sebagai float32, float16,
+    atau int8 dengan satu scale float32 per baris (scale = max|x| / 127).
+
+    Semua yang keluar (baris, hasil matmul) selalu float32. Untuk float32
+    tidak ada konversi sama sekali, jadi path lama tidak berubah.
+    """
+
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales
+
+    @classmethod
+    def from_float(cls, matrix, dtype: str = VECTOR_DTYPE) -> "QuantizedMatrix":
+        dtype = check_dtype(dtype)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if dtype == "float32":
+            return cls(matrix)
+        if dtype == "float16":
+            return cls(matrix.astype(np.float16))
+        scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+        scales = scales.astype(np.float32)
+        inv = np.divide(1.0, scales, out=np.zeros_like(scales), where=scales > 0)
+        data = np.clip(np.rint(matrix * inv[:, None]), -127, 127).astype(np.int8)
+        return cls(data, scales)
+
+    @property
+    def dtype(self) -> str:
+        return "int8" if self.scales is not None else str(self.data.dtype)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __getitem__(self, index) -> np.ndarray:
+        """Baris (int, slice, index array, atau mask) sebagai float32."""
+        rows = self.data[index]
+        if self.scales is not None:
+            scales = self.scales[index]
+            return rows.astype(np.float32) * (scales[..., None] if np.ndim(scales) else scales)
+        return rows if rows.dtype == np.float32 else rows.astype(np.float32)
+
+    def to_float32(self) -> np.ndarray:
+        return self[:]
+
+    def matmul(self, rhs) -> np.ndarray:
+        """self @ rhs dalam float32, dequantize per BLOCK_ROWS baris."""
+        rhs = np.asarray(rhs, dtype=np.float32)
+        if self.data.dtype == np.float32:
+            return self.data @ rhs
+        out = np.empty((len(self),) + rhs.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            # scale per baris bisa dikali setelah matmul
+            out[block] = self.data[block].astype(np.float32) @ rhs
+            if self.scales is not None:
+                scales = self.scales[block]
+                out[block] *= scales[:, None] if out.ndim == 2 else scales
+        return out
+
+    def row_norms(self) -> np.ndarray:
+        norms = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            rows = self[block]
+            norms[block] = np.sqrt(np.einsum("ij,ij->i", rows, rows))
+        return norms
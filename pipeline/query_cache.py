@@ -0,0 +1,166 @@
+# pipeline/query_cache.py
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from pipeline.embedding_cache import normalize_text
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL")) if os.getenv("QUERY_CACHE_TTL") else 600
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE")) if os.getenv("QUERY_CACHE_SIZE") else 256
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE", "1") not in ("0", "false", "False")
+# ditulis ulang oleh ingestion setiap kali isi index berubah
+INDEX_VERSION_PATH = os.getenv("INDEX_VERSION_PATH") or str(BASE_DIR / "pipeline" / "store" / "index_version")
+# seberapa sering file versi dicek (detik), supaya tidak stat() di setiap query
+INDEX_VERSION_CHECK_EVERY = 5.0
+
+
+def normalize_query(query: str) -> str:
+    return normalize_text(query).lower()
+
+
+def read_index_version() -> str:
+    """Versi index = isi file versi dari ingestion + env INDEX_VERSION
+    (untuk deploy yang tidak berbagi disk dengan ingestion)."""
+    try:
+        with open(INDEX_VERSION_PATH, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        version = ""
+    return f"{os.getenv('INDEX_VERSION', '')}:{version}"
+
+
+def bump_index_version():
+    path = Path(INDEX_VERSION_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(f"{time.time_ns()}", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class QueryCache:
+    """Cache hasil RAG per query (ID hasil fusion + vector + metadata).
+
+    LRU di memory dengan TTL. Query identik yang datang bersamaan hanya
+    dihitung sekali (single-flight), sisanya menunggu hasil yang sama.
+    Semua entry dibuang kalau versi index berubah.
+    """
+
+    def __init__(self, ttl: float = QUERY_CACHE_TTL, max_items: int = QUERY_CACHE_SIZE,
+                 version_fn=read_index_version):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.version_fn = version_fn
+        self._items: OrderedDict = OrderedDict()  # key -> (value, expires_at)
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self._version = version_fn()
+        self._version_checked = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def _check_version(self, now):
+        if now - self._version_checked < INDEX_VERSION_CHECK_EVERY:
+            return
+        self._version_checked = now
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self._items.clear()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(now)
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < now:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            if version is not None and version != self._version:
+                # index berubah selama query dihitung, jangan simpan hasil lama
+                return
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _claim(self, key):
+        """Return (value, future, owner). value tidak None kalau cache hit."""
+        value = self.get(key)
+        if value is not None:
+            return value, None, False
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.shared += 1
+                return None, fut, False
+            fut = Future()
+            self._inflight[key] = fut
+            self.misses += 1
+            return None, fut, True
+
+    def _finish(self, key, fut, version, value=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            fut.set_exception(error)
+            return
+        self.put(key, value, version)
+        fut.set_result(value)
+
+    def get_or_compute(self, key, compute):
+        value, fut, owner = self._claim(key)
+        if value is not None:
+            return value
+        if not owner:
+            return fut.result()
+        version = self._version
+        try:
+            value = compute()
+        except BaseException as e:
+            self._finish(key, fut, version, error=e)
+            raise
+        self._finish(key, fut, version, value)
+        return value
+
+    async def get_or_compute_async(self, key, compute):
+        """Sama seperti get_or_compute, `compute` adalah coroutine function."""
+        value, fut, owner = self._claim(key)
+        if value is not None:
+            return value
+        if not owner:
+            return await asyncio.wrap_future(fut)
+        version = self._version
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._finish(key, fut, version, error=e)
+            raise
+        self._finish(key, fut, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        return {"items": len(self._items), "hits": self.hits, "misses": self.misses, "shared": self.shared}
@@ -0,0 +1,33 @@
+# pipeline/query_context.py
+from pipeline.get_embedding import (
+    EMBED_DIM,
+    get_dense_embeddings,
+    get_dense_embeddings_async,
+    get_sparse_embeddings,
+)
+
+
+class QueryContext:
+    """State per request: vector dense dan sparse dari query dihitung sekali,
+    lalu dipakai ulang oleh retrieval, fusion, dan AlgorithmClass.mapping_input."""
+
+    def __init__(self, text: str, dim: int = EMBED_DIM, dense=None, sparse=None):
+        self.text = text
+        self.dim = dim
+        self.dense = dense
+        self.sparse = sparse
+
+    def get_dense(self):
+        if self.dense is None:
+            self.dense = get_dense_embeddings(self.text, self.dim)
+        return self.dense
+
+    async def get_dense_async(self):
+        if self.dense is None:
+            self.dense = await get_dense_embeddings_async(self.text, self.dim)
+        return self.dense
+
+    def get_sparse(self, bm25_model):
+        if self.sparse is None:
+            self.sparse = get_sparse_embeddings(text=self.text, bm25_model=bm25_model, query_type='search')
+        return self.sparse
@@ -1,12 +1,20 @@
 # pipeline/rag_pipeline.py
 import os
+import asyncio
+import copy
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import json
-from functools import lru_cache
 from pinecone.grpc import PineconeGRPC as Pinecone
-from pipeline.get_embedding import get_dense_embeddings, get_sparse_embeddings
-from pipeline.bm25_model import load_bm25_model
+from pipeline.query_context import QueryContext
+from pipeline.get_embedding import get_dense_embeddings_batch_async
+from pipeline.bm25_model import load_bm25_encoder
+from pipeline.vector_index import VECTOR_BACKEND, PineconeVectorIndex, coarse_namespace, get_vector_index, truncate_vectors
+from pipeline.recipe_store import RecipeStore
+from pipeline.resources import lazy
+from pipeline.query_cache import QUERY_CACHE_ENABLED, QueryCache, normalize_query
+from pipeline.quantize import VECTOR_DTYPE, QuantizedMatrix
+from mapping import FINAL_LAMBDA, blend_vectors
 import numpy as np
 
 # Suppress logging warnings
@@ -24,27 +32,81 @@ SILICONFLOW_API_KEY = os.getenv('SILICONFLOW_API_KEY')
 
 NAMESPACE = os.getenv('NAMESPACE')
 NAMESPACE2 = os.getenv('NAMESPACE2')
+# namespace hasil ingest.build_final_vectors (mis. final-0.5). Kalau diisi, hydration cukup fetch
+# final vector dari sini (bukan vector all-text) dan AlgorithmClass tidak perlu blending lagi
+NAMESPACE_FINAL = os.getenv('NAMESPACE_FINAL')
+HYDRATE_NAMESPACE, HYDRATE_KEY = (NAMESPACE_FINAL, 'final_vector') if NAMESPACE_FINAL else (NAMESPACE2, 'vector_all')
 TOP_K = 50
 EMBED_DIM = int(os.getenv('EMBED_DIM')) if os.getenv('EMBED_DIM') else 1024
-RECIPES_FOLDER = 'data/clean'
+RECIPES_FOLDER = os.getenv('RECIPES_FOLDER') or 'data/clean'
 SIMILARITY_THRESHOLD = 0.7
+# sparse: sparse dulu, dense kalau kosong | dense | hybrid: dense+sparse paralel, RRF | weighted: dense+sparse paralel, skor berbobot
+RETRIEVAL_MODES = ("sparse", "dense", "hybrid", "weighted")
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE') or 'sparse'
+HYBRID_ALPHA = float(os.getenv('HYBRID_ALPHA')) if os.getenv('HYBRID_ALPHA') else 0.5
+# two-stage dense search (Matryoshka): COARSE_DIM > 0 -> shortlist COARSE_SHORTLIST dari index
+# COARSE_DIM dimensi, lalu hanya shortlist yang di-rescore dengan vector penuh NAMESPACE
+COARSE_DIM = int(os.getenv('COARSE_DIM')) if os.getenv('COARSE_DIM') else 0
+COARSE_SHORTLIST = int(os.getenv('COARSE_SHORTLIST')) if os.getenv('COARSE_SHORTLIST') else 200
+# Pinecone: index terpisah berdimensi COARSE_DIM (local: namespace di index yang sama)
+NAME_PINECONE_COARSE = os.getenv('NAME_PINECONE_COARSE')
+BATCH_QUERY_CONCURRENCY = int(os.getenv('BATCH_QUERY_CONCURRENCY')) if os.getenv('BATCH_QUERY_CONCURRENCY') else 8
+
+# config: koneksi Pinecone dan BM25 dibuat saat pertama dipakai (atau lewat resources.warm_up)
+def _pinecone_indexes():
+    if VECTOR_BACKEND == "local":
+        return None, None
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    return pc.Index(name=NAME_PINECONE_DENSE), pc.Index(name=NAME_PINECONE_SPARSE)
+
+def _create_vector_index():
+    return get_vector_index(*pinecone_indexes.get())
+
+def _create_coarse_index():
+    if not COARSE_DIM:
+        return None
+    if VECTOR_BACKEND == "local":
+        return vector_index.get()
+    return PineconeVectorIndex(Pinecone(api_key=PINECONE_API_KEY).Index(name=NAME_PINECONE_COARSE), None)
+
+pinecone_indexes = lazy("pinecone_indexes", _pinecone_indexes)
+vector_index = lazy("vector_index", _create_vector_index)
+coarse_index = lazy("coarse_index", _create_coarse_index)
+bm25 = lazy("bm25", load_bm25_encoder)
+recipe_store = RecipeStore(RECIPES_FOLDER)
+# query dense dan sparse mode hybrid jalan bersamaan
+_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-query")
+# hasil RAG per query (query populer tidak perlu ke index lagi)
+query_cache = QueryCache() if QUERY_CACHE_ENABLED else None
+
+def _apply_threshold(results):
+    # filter threshold
+    if any((r.get("similarity") or 0.0) > SIMILARITY_THRESHOLD for r in results):
+        results = [r for r in results if (r.get("similarity") or 0.0) > SIMILARITY_THRESHOLD]
+    return results
 
-# config
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index_dense = pc.Index(name=NAME_PINECONE_DENSE)
-index_sparse = pc.Index(name=NAME_PINECONE_SPARSE)
-bm25 = load_bm25_model()
-
-def search_dense_index(text: str):
-    vec = get_dense_embeddings(text, EMBED_DIM)
-    dense_response = index_dense.query(
-        namespace=NAMESPACE,
-        vector= vec,
-        top_k=TOP_K,
-        include_metadata=True,
-        include_values=True
-    )
-    matches = dense_response.get("matches", []) or []
+def _two_stage_dense_query(vec, include_values=True):
+    """Shortlist dari index COARSE_DIM, rescoring cosine penuh hanya untuk shortlist."""
+    shortlist = coarse_index.get().query_dense(
+        coarse_namespace(NAMESPACE, COARSE_DIM), truncate_vectors(vec, COARSE_DIM).tolist(), COARSE_SHORTLIST)
+    ids = [m.get("id") for m in shortlist if m.get("id")]
+    if not ids:
+        return []
+    matrix, found = vector_index.get().fetch_matrix(ids, NAMESPACE)
+    scores = np.where(found, _cosine_rows(matrix, vec), -np.inf)
+    order = np.argsort(-scores, kind="stable")[:min(TOP_K, int(found.sum()))]
+    return [{
+        "id": ids[i],
+        "score": float(scores[i]),
+        "metadata": shortlist[i].get("metadata") or {},
+        "values": matrix[i] if include_values else None,
+    } for i in order]
+
+def _dense_query(vec, include_values=True):
+    if COARSE_DIM:
+        matches = _two_stage_dense_query(vec, include_values)
+    else:
+        matches = vector_index.get().query_dense(NAMESPACE, vec, TOP_K, include_values=include_values)
     results = [{
         "id": item.get("id"),
         "similarity": item.get('score', 0.0),
@@ -52,67 +114,51 @@ def search_dense_index(text: str):
         "values": item.get('values')
     } for item in matches]
 
-    # filter threshold
-    if any((r.get("similarity") or 0.0) > SIMILARITY_THRESHOLD for r in results):
-        results = [r for r in results if (r.get("similarity") or 0.0) > SIMILARITY_THRESHOLD]
+    return _apply_threshold(results)
 
-    return results
+def search_dense_index(text: str, ctx: QueryContext = None):
+    ctx = ctx or QueryContext(text, EMBED_DIM)
+    # dengan final vector, vector bahan tidak dipakai lagi setelah query
+    return _dense_query(ctx.get_dense(), include_values=not NAMESPACE_FINAL)
 
 def cosine_similarity(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
-def _fetch_dense_values_by_ids(ids, query_vec=None):
+def _cosine_rows(matrix, query_vec):
+    """Cosine similarity tiap baris matrix ke query dalam satu matmul."""
+    q = np.asarray(query_vec, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(q)
+    norms[norms == 0] = 1.0
+    return (matrix @ q) / norms
+
+def _fetch_values(ids, namespace):
     """
-    Ambil dense embedding values dari index_dense untuk sekumpulan ID.
-    Return: dict[id] -> values (list of floats)
+    Fetch vector untuk sekumpulan ID dari `namespace`.
+    Return: dict[id] -> values (baris float32 dari satu matrix)
     """
-    if not ids:
-        return {}, {}
-
-    dense_fetch = index_dense.fetch(ids=ids, namespace=NAMESPACE) or {}
-
-    vectors_obj = dense_fetch.vectors or {}
-
-    if isinstance(vectors_obj, dict):
-        vectors_map = vectors_obj
-    elif isinstance(vectors_obj, list):
-        vectors_map = {v.get("id"): v for v in vectors_obj if v and v.get("id")}
-    else:
-        vectors_map = {}
+    if not ids or not namespace:
+        return {}
+    matrix, found = vector_index.get().fetch_matrix(ids, namespace)
+    return {_id: matrix[i] for i, _id in enumerate(ids) if found[i]}
 
-    # Ekstrak values
-    out = {}
-    sim = {}
-    for _id, rec in vectors_map.items():
-        if not rec:
-            continue
-        values = rec.get("values")
-        if values is None:
-            values = (rec.get("vector") or {}).get("values")
-        if values is not None:
-            out[_id] = values
-            sim[_id] = cosine_similarity(values, query_vec)
-    
-    return out, sim
-
-def search_sparse_index(text: str):
-    sp = get_sparse_embeddings(text=text, bm25_model=bm25, query_type='search')
-    sparse_response = index_sparse.query(
-        namespace=NAMESPACE,
-        sparse_vector=sp,
-        top_k=TOP_K,
-        include_metadata=True,
-        include_values=False
-    )
-    matches = sparse_response.get("matches", []) or []
+def fetch_vectors(ids, namespaces):
+    """Satu tahap hydration: fetch semua namespace bersamaan.
+    Return: list dict[id] -> values, urut sesuai `namespaces`."""
+    futures = [_query_executor.submit(_fetch_values, ids, ns) for ns in namespaces]
+    return [f.result() for f in futures]
 
-    # get id from sparse search
-    ids = [m.get("id") for m in matches if m.get("id")]
+def _similarities(id_to_values, query_vec):
+    if not id_to_values:
+        return {}
+    ids = list(id_to_values)
+    sims = _cosine_rows(np.asarray([id_to_values[_id] for _id in ids], dtype=np.float32), query_vec)
+    return dict(zip(ids, sims.tolist()))
 
-    # fetch dense embedding from id above
-    query_dense_vec = get_dense_embeddings(text, EMBED_DIM)
-    id_to_dense_values, id_to_sim = _fetch_dense_values_by_ids(ids, query_dense_vec)
+def _sparse_query(ctx: QueryContext):
+    sp = ctx.get_sparse(bm25.get())
+    return vector_index.get().query_sparse(NAMESPACE, sp, TOP_K)
 
+def _sparse_results(matches, id_to_dense_values, id_to_sim):
     # map output
     results = []
     for item in matches:
@@ -120,14 +166,31 @@ def search_sparse_index(text: str):
         results.append({
             "id": _id,
             "similarity": id_to_sim.get(_id, 0.0),
+            "sparse_score": item.get("score", 0.0),
             "category": (item.get("metadata") or {}).get("category", ''),
             "values": id_to_dense_values.get(_id)
         })
 
-    # filter threshold
-    if any((r.get("similarity") or 0.0) > SIMILARITY_THRESHOLD for r in results):
-        results = [r for r in results if (r.get("similarity") or 0.0) > SIMILARITY_THRESHOLD]
+    return _apply_threshold(results)
+
+def search_sparse_index(text: str, ctx: QueryContext = None):
+    ctx = ctx or QueryContext(text, EMBED_DIM)
+    matches = _sparse_query(ctx)
+
+    # get id from sparse search
+    ids = [m.get("id") for m in matches if m.get("id")]
+
+    # dense values (NAMESPACE) + vector hydration (NAMESPACE2 / NAMESPACE_FINAL) di-fetch bersamaan.
+    # Dengan NAMESPACE_FINAL tetap dua fetch: threshold similarity dihitung dari vector bahan,
+    # cosine ke final vector meloloskan kandidat yang berbeda
+    query_dense_vec = ctx.get_dense()
+    values_future = _query_executor.submit(_fetch_values, ids, NAMESPACE)
+    fetched_all = batch_fetch_all_vectors(ids)
+    id_to_dense_values = values_future.result()
 
+    results = _sparse_results(matches, id_to_dense_values, _similarities(id_to_dense_values, query_dense_vec))
+    for r in results:
+        r[HYDRATE_KEY] = fetched_all.get(r['id'])
     return results
 
 """
@@ -153,82 +216,88 @@ def rrf_fusion(dense_results, sparse_results, k=60, top_n=TOP_K):
 
     return fused_results
 
-def batch_fetch_all_vectors(ids):
-    """Fetch the ALL-TEXT vectors for a list of IDs from NAMESPACE2 in one RPC.
-    Returns a dict: id -> {id, values, metadata}
-    """
-    if not ids:
-        return {}
-    if not NAMESPACE2:
+def _min_max(results, key):
+    scores = np.array([r.get(key) or 0.0 for r in results], dtype=np.float32)
+    if not len(scores):
         return {}
+    lo, hi = scores.min(), scores.max()
+    scores = (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+    return {r['id']: float(score) for r, score in zip(results, scores)}
 
-    fetched = index_dense.fetch(ids=ids, namespace=NAMESPACE2)
-    return fetched.vectors
-
-@lru_cache(maxsize=1)
-def _build_recipe_lookup(folder_path: str):
-    lookup = {}
-    if not folder_path or not os.path.isdir(folder_path):
-        return lookup
-
-    try:
-        with os.scandir(folder_path) as it:
-            for entry in it:
-                if not entry.is_file() or not entry.name.endswith('.json'):
-                    continue
-                try:
-                    with open(entry.path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                except Exception:
-                    continue
-
-                items = data if isinstance(data, list) else [data]
-                for obj in items:
-                    if not isinstance(obj, dict):
-                        continue
-                    rid = obj.get('id')
-                    if not rid:
-                        continue
-                    lookup[rid] = {
-                        'url': obj.get('url'),
-                        'title': obj.get('title'),
-                        'image': obj.get('image'),
-                        'ingredients': obj.get('ingredients'),
-                        'steps': obj.get('steps'),
-                    }
-    except Exception:
-        return lookup
-
-    return lookup
-
-def RAG_pipeline(query: str):
-    # 1. Try sparse search first
-    sparse_results = search_sparse_index(query)
-    results = sparse_results
-    ids = [r['id'] for r in sparse_results]
-
-    # 2. Fallback: if no sparse matches, try dense search
-    if not ids:
-        dense_results = search_dense_index(query)
-        results = dense_results
-        ids = [r['id'] for r in dense_results]
+"""
+weighted score(d) = alpha * dense(d) + (1 - alpha) * sparse(d), kedua skor di-min-max normalize per query
+"""
+def weighted_fusion(dense_results, sparse_results, alpha=HYBRID_ALPHA, top_n=TOP_K):
+    dense_scores = _min_max(dense_results, "similarity")
+    sparse_scores = _min_max(sparse_results, "sparse_score")
 
-    # 3. If still no results, return []
-    if not ids:
-        return []
+    scores = {doc_id: alpha * dense_scores.get(doc_id, 0.0) + (1 - alpha) * sparse_scores.get(doc_id, 0.0)
+              for doc_id in {**dense_scores, **sparse_scores}}
 
-    # 4. Fetch "all-text" vectors
-    fetched_all = batch_fetch_all_vectors(ids)
+    fused = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    all_results = {r['id']: r for r in dense_results + sparse_results}
+    return [all_results[doc_id] for doc_id, _ in fused[:top_n]]
+
+def _split_known_values(dense_results, matches):
+    # dense query sudah bawa values, cukup fetch ID yang hanya muncul di sparse
+    known = {r['id']: r['values'] for r in dense_results if r.get('values') is not None}
+    missing = [m.get("id") for m in matches if m.get("id") and m.get("id") not in known]
+    return known, missing
+
+def _fuse(mode, dense_results, matches, id_to_dense_values, query_vec):
+    sparse_results = _sparse_results(
+        matches, id_to_dense_values, _similarities(id_to_dense_values, query_vec))
+    if mode == "weighted":
+        return weighted_fusion(dense_results, sparse_results)
+    return rrf_fusion(dense_results, sparse_results)
+
+def search_hybrid_index(text: str, ctx: QueryContext = None, mode: str = "hybrid"):
+    """Dense dan sparse query jalan bersamaan lalu digabung (RRF atau weighted)."""
+    ctx = ctx or QueryContext(text, EMBED_DIM)
+    # BM25 encode + sparse query overlap dengan embedding query + dense query
+    sparse_future = _query_executor.submit(_sparse_query, ctx)
+    query_dense_vec = ctx.get_dense()
+    dense_results = _dense_query(query_dense_vec)
+    matches = sparse_future.result()
+
+    known, missing = _split_known_values(dense_results, matches)
+    known.update(_fetch_values(missing, NAMESPACE))
+    return _fuse(mode, dense_results, matches, known, query_dense_vec)
+
+def _check_mode(mode):
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}")
+    return mode
 
-    # 5. Load recipe metadata
-    recipe_lookup = _build_recipe_lookup(RECIPES_FOLDER)
+def batch_fetch_all_vectors(ids):
+    """Fetch the ALL-TEXT vectors (NAMESPACE2) for a list of IDs in one RPC,
+    or the precomputed final vectors when NAMESPACE_FINAL is set.
+    Returns a dict: id -> values (disimpan di result[HYDRATE_KEY])
+    """
+    fetched = _fetch_values(ids, HYDRATE_NAMESPACE)
+    missing = [_id for _id in ids if _id not in fetched] if NAMESPACE_FINAL else []
+    if missing:
+        # final vector belum di-build untuk resep ini: blend dari vector bahan + all-text
+        # (NAMESPACE_FINAL diasumsikan final_namespace(FINAL_LAMBDA))
+        print(f"{len(missing)}/{len(ids)} ids missing from {NAMESPACE_FINAL}, blending per request "
+              f"(build it with pipeline/pinecone_setup.py)")
+        ingredients, all_text = fetch_vectors(missing, (NAMESPACE, NAMESPACE2))
+        for _id in missing:
+            if _id in ingredients and _id in all_text:
+                fetched[_id] = blend_vectors(ingredients[_id], all_text[_id], FINAL_LAMBDA)
+    return fetched
+
+def _merge_recipe_data(results, fetched_all=None):
+    # 5. Load recipe metadata (hanya ID yang dibutuhkan)
+    recipe_lookup = recipe_store.get_many([r['id'] for r in results])
 
     # 6. Merge vectors + recipe metadata into results
     all_data = []
     for r in results:
         _id = r['id']
-        all_payload = fetched_all.get(_id) if fetched_all else None
-        r['vector_all'] = all_payload.get('values') if all_payload else None
+        if fetched_all is not None:
+            r[HYDRATE_KEY] = fetched_all.get(_id)
 
         recipe = recipe_lookup.get(_id)
         if recipe:
@@ -251,3 +320,222 @@ def RAG_pipeline(query: str):
         all_data.append(r)
 
     return all_data
+
+def retrieve_candidates(query: str, ctx: QueryContext = None, mode: str = None):
+    """Tahap retrieval saja: ID kandidat + dense values + similarity, tanpa
+    vector all-text dan metadata (lihat `hydrate_candidates`).
+    `mode` salah satu RETRIEVAL_MODES, default RETRIEVAL_MODE."""
+    mode = _check_mode(mode)
+    ctx = ctx or QueryContext(query, EMBED_DIM)
+
+    if mode == "dense":
+        return search_dense_index(query, ctx)
+    if mode in ("hybrid", "weighted"):
+        return search_hybrid_index(query, ctx, mode)
+
+    # 1. Try sparse search first
+    results = search_sparse_index(query, ctx)
+
+    # 2. Fallback: if no sparse matches, try dense search
+    if not results:
+        results = search_dense_index(query, ctx)
+
+    return results
+
+def hydrate_candidates(results):
+    """Lengkapi hasil `retrieve_candidates` dengan vector all-text (atau final
+    vector) dan metadata resep."""
+    # 3. If still no results, return []
+    ids = [r['id'] for r in results]
+    if not ids:
+        return []
+
+    # 4. Fetch "all-text" vectors, kecuali yang sudah ikut di-fetch saat retrieval
+    attach_hydration_vectors(results)
+
+    return _merge_recipe_data(results)
+
+def attach_hydration_vectors(results):
+    """Isi result[HYDRATE_KEY] (vector all-text atau final vector) yang belum
+    ada dengan satu fetch, tanpa metadata resep."""
+    missing = [r['id'] for r in results if HYDRATE_KEY not in r]
+    fetched_all = batch_fetch_all_vectors(missing)
+    for r in results:
+        if HYDRATE_KEY not in r:
+            r[HYDRATE_KEY] = fetched_all.get(r['id'])
+    return results
+
+def get_recipe_metadata(rid: str):
+    """Metadata satu resep (title, image, ingredients, steps), None kalau tidak ada."""
+    return recipe_store.get(rid)
+
+def _cache_key(query: str, mode: str):
+    return (normalize_query(query), mode, EMBED_DIM)
+
+# field vector di hasil RAG, disimpan di cache sebagai satu matrix per field
+_VECTOR_FIELDS = ("values", "vector_all", "final_vector")
+
+def _pack_results(results):
+    """Bentuk hasil untuk disimpan di cache: metadata per hasil + satu
+    QuantizedMatrix per field vector (VECTOR_DTYPE), bukan vector per dict."""
+    rows = [{k: v for k, v in r.items() if k not in _VECTOR_FIELDS} for r in results]
+    vectors = {}
+    for field in _VECTOR_FIELDS:
+        present = np.array([field in r for r in results], dtype=bool)
+        if not present.any():
+            continue
+        found = np.array([r.get(field) is not None for r in results], dtype=bool)
+        found_values = [r[field] for r, ok in zip(results, found) if ok]
+        matrix = QuantizedMatrix.from_float(
+            np.asarray(found_values, dtype=np.float32) if found_values else np.zeros((0, 0), dtype=np.float32),
+            VECTOR_DTYPE)
+        vectors[field] = (present, found, matrix)
+    return rows, vectors
+
+def _unpack_results(packed):
+    # caller dapat copy penuh (termasuk list ingredients / steps), jadi mengubah hasil
+    # tidak mengubah entry cache; vector jadi baris float32
+    rows, vectors = packed
+    results = copy.deepcopy(rows)
+    for field, (present, found, matrix) in vectors.items():
+        values = matrix.to_float32()
+        positions = np.cumsum(found) - 1
+        for i, r in enumerate(results):
+            if present[i]:
+                r[field] = values[positions[i]] if found[i] else None
+    return results
+
+def get_cached_results(query: str, mode: str = None):
+    """Hasil RAG_pipeline dari cache, None kalau belum ada / expired."""
+    if query_cache is None:
+        return None
+    packed = query_cache.get(_cache_key(query, _check_mode(mode)))
+    return _unpack_results(packed) if packed is not None else None
+
+def cache_results(query: str, results, mode: str = None):
+    if query_cache is not None:
+        query_cache.put(_cache_key(query, _check_mode(mode)), _pack_results(results))
+
+def RAG_pipeline(query: str, ctx: QueryContext = None, mode: str = None):
+    mode = _check_mode(mode)
+    # vector query dihitung sekali per request
+    ctx = ctx or QueryContext(query, EMBED_DIM)
+
+    def compute():
+        return hydrate_candidates(retrieve_candidates(query, ctx, mode))
+
+    if query_cache is None:
+        return compute()
+    return _unpack_results(query_cache.get_or_compute(_cache_key(query, mode), lambda: _pack_results(compute())))
+
+async def _retrieve_async(ctx: QueryContext, mode: str):
+    # mode dense / hybrid / weighted -> (results, fetched_all)
+    async def dense_side():
+        vec = await ctx.get_dense_async()
+        # hybrid butuh values untuk similarity hasil sparse, dense saja tidak kalau ada final vector
+        return await asyncio.to_thread(_dense_query, vec, mode != "dense" or not NAMESPACE_FINAL)
+
+    if mode == "dense":
+        results = await dense_side()
+    else:
+        dense_results, matches = await asyncio.gather(
+            dense_side(), asyncio.to_thread(_sparse_query, ctx))
+        known, missing = _split_known_values(dense_results, matches)
+        known.update(await asyncio.to_thread(_fetch_values, missing, NAMESPACE))
+        results = _fuse(mode, dense_results, matches, known, ctx.dense)
+
+    fetched_all = await asyncio.to_thread(batch_fetch_all_vectors, [r['id'] for r in results])
+    return results, fetched_all
+
+async def RAG_pipeline_async(query: str, ctx: QueryContext = None, mode: str = None):
+    """Versi asyncio dari RAG_pipeline, hasilnya sama (dan berbagi cache yang sama).
+
+    Embedding query (HTTP async) jalan bersamaan dengan BM25 encode + sparse
+    query, lalu fetch NAMESPACE dan NAMESPACE2 jalan bersamaan karena hanya
+    butuh ID. Call Pinecone (gRPC, blocking) dijalankan di thread supaya
+    event loop tidak ke-block.
+    """
+    mode = _check_mode(mode)
+    ctx = ctx or QueryContext(query, EMBED_DIM)
+    if query_cache is None:
+        return await _rag_pipeline_async(ctx, mode)
+    async def compute():
+        return _pack_results(await _rag_pipeline_async(ctx, mode))
+
+    return _unpack_results(await query_cache.get_or_compute_async(_cache_key(query, mode), compute))
+
+async def _batch_contexts(queries):
+    """QueryContext untuk banyak query: embedding dense dalam satu batch call,
+    BM25 query encoding sekaligus."""
+    texts = list(dict.fromkeys(queries))
+    dense, sparse = await asyncio.gather(
+        get_dense_embeddings_batch_async(texts, EMBED_DIM),
+        asyncio.to_thread(lambda: bm25.get().encode_queries(texts)),
+    )
+    return {text: QueryContext(text, EMBED_DIM, dense=vec, sparse=sp)
+            for text, vec, sp in zip(texts, dense, sparse)}
+
+async def RAG_pipeline_batch_async(queries: list[str], mode: str = None,
+                                   max_concurrency: int = BATCH_QUERY_CONCURRENCY):
+    """RAG_pipeline_async untuk banyak query sekaligus, hasil urut sesuai `queries`.
+
+    Query yang sudah ada di cache tidak di-embed ulang; sisanya di-embed dalam
+    satu batch, lalu query ke index jalan paralel dibatasi `max_concurrency`.
+    Return: list of (results, error) per query.
+    """
+    mode = _check_mode(mode)
+    cached = [get_cached_results(q, mode) for q in queries]
+    contexts = await _batch_contexts([q for q, c in zip(queries, cached) if c is None])
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(query, hit):
+        if hit is not None:
+            return hit, None
+        async with semaphore:
+            try:
+                return await RAG_pipeline_async(query, contexts[query], mode), None
+            except Exception as e:
+                return None, e
+
+    return await asyncio.gather(*(run(q, c) for q, c in zip(queries, cached)))
+
+async def _rag_pipeline_async(ctx: QueryContext, mode: str):
+    if mode != "sparse":
+        results, fetched_all = await _retrieve_async(ctx, mode)
+        if not results:
+            return []
+        return await asyncio.to_thread(_merge_recipe_data, results, fetched_all)
+
+    dense_task = asyncio.create_task(ctx.get_dense_async())
+    try:
+        # 1. Sparse search, overlap dengan embedding query
+        matches = await asyncio.to_thread(_sparse_query, ctx)
+        ids = [m.get("id") for m in matches if m.get("id")]
+
+        if ids:
+            # fetch dense values (NAMESPACE) + vector hydration (NAMESPACE2 / NAMESPACE_FINAL) sekaligus
+            id_to_dense_values, fetched_all = await asyncio.gather(
+                asyncio.to_thread(_fetch_values, ids, NAMESPACE),
+                asyncio.to_thread(batch_fetch_all_vectors, ids),
+            )
+            query_dense_vec = await dense_task
+            results = _sparse_results(
+                matches, id_to_dense_values, _similarities(id_to_dense_values, query_dense_vec))
+        else:
+            # 2. Fallback: dense search butuh embedding query dulu
+            query_dense_vec = await dense_task
+            results = await asyncio.to_thread(_dense_query, query_dense_vec, not NAMESPACE_FINAL)
+            ids = [r['id'] for r in results]
+
+            # 3. If still no results, return []
+            if not ids:
+                return []
+
+            # 4. Fetch "all-text" (atau final) vectors
+            fetched_all = await asyncio.to_thread(batch_fetch_all_vectors, ids)
+    finally:
+        if not dense_task.done():
+            dense_task.cancel()
+
+    # lookup ke SQLite (dan build store saat pertama kali), jangan di event loop
+    return await asyncio.to_thread(_merge_recipe_data, results, fetched_all)
@@ -0,0 +1,150 @@
+# pipeline/recipe_store.py
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RECIPE_STORE_PATH = os.getenv("RECIPE_STORE_PATH") or str(BASE_DIR / "pipeline" / "store" / "recipes.sqlite")
+
+
+def iter_recipe_files(folder_path: str):
+    """Yield (path, stat) file .json di folder, urut nama supaya deterministik."""
+    if not folder_path or not os.path.isdir(folder_path):
+        return
+    with os.scandir(folder_path) as it:
+        entries = sorted((e for e in it if e.is_file() and e.name.endswith('.json')), key=lambda e: e.name)
+    for entry in entries:
+        yield entry.path, entry.stat()
+
+
+def iter_recipes(folder_path: str, errors: list = None):
+    """Yield dict resep satu per satu dari semua file .json di folder.
+    Path file yang gagal dibaca dicatat ke `errors` (kalau diberikan)."""
+    for path, _ in iter_recipe_files(folder_path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            if errors is not None:
+                errors.append(path)
+            continue
+
+        items = data if isinstance(data, list) else [data]
+        for obj in items:
+            if isinstance(obj, dict) and obj.get('id'):
+                yield obj
+
+
+def _fingerprint(folder_path: str) -> str:
+    # nama + ukuran + mtime tiap file, cukup untuk tahu kapan store harus di-build ulang
+    parts = [f"{os.path.basename(p)}:{st.st_size}:{st.st_mtime_ns}" for p, st in iter_recipe_files(folder_path)]
+    return "|".join(parts)
+
+
+class RecipeStore:
+    """Metadata resep (url, title, image, ingredients, steps) di SQLite.
+
+    Di-build sekali dari `data/clean` dan di-build ulang kalau isi folder berubah.
+    Koneksi dibuka saat pertama dipakai (satu per thread), dan hanya resep yang
+    diminta lewat `get_many` yang dibaca ke memory.
+    """
+
+    def __init__(self, folder_path: str, path: str = RECIPE_STORE_PATH):
+        self.folder_path = folder_path
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_built(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            fingerprint = _fingerprint(self.folder_path)
+            if self._stored_fingerprint() != fingerprint:
+                self.build(fingerprint)
+            self._ready = True
+
+    def _stored_fingerprint(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with sqlite3.connect(self.path) as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
+
+    def build(self, fingerprint: str = None):
+        """Compile semua resep di folder ke file SQLite baru lalu ganti file lama."""
+        if fingerprint is None:
+            fingerprint = _fingerprint(self.folder_path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute(
+                "CREATE TABLE recipes ("
+                " id TEXT PRIMARY KEY, url TEXT, title TEXT, image TEXT,"
+                " ingredients TEXT, steps TEXT)"
+            )
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany(
+                "INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?, ?, ?)",
+                ((obj['id'], obj.get('url'), obj.get('title'), obj.get('image'),
+                  json.dumps(obj.get('ingredients'), ensure_ascii=False),
+                  json.dumps(obj.get('steps'), ensure_ascii=False))
+                 for obj in iter_recipes(self.folder_path))
+            )
+            conn.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.path)
+        # koneksi lama menunjuk ke file yang sudah diganti
+        self._local = threading.local()
+
+    def get_many(self, ids: list[str]) -> dict:
+        """Bulk lookup: return dict id -> {url, title, image, ingredients, steps}."""
+        ids = [i for i in dict.fromkeys(ids) if i]
+        if not ids:
+            return {}
+        self._ensure_built()
+        conn = self._connect()
+
+        out = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for rid, url, title, image, ingredients, steps in conn.execute(
+                    f"SELECT id, url, title, image, ingredients, steps FROM recipes WHERE id IN ({marks})", chunk):
+                out[rid] = {
+                    'url': url,
+                    'title': title,
+                    'image': image,
+                    'ingredients': json.loads(ingredients) if ingredients is not None else None,
+                    'steps': json.loads(steps) if steps is not None else None,
+                }
+        return out
+
+    def get(self, rid: str):
+        return self.get_many([rid]).get(rid)
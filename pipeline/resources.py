@@ -0,0 +1,66 @@
+# pipeline/resources.py
+import threading
+import time
+
+
+class LazyResource:
+    """Resource (client, index handle, model) yang baru dibuat saat pertama
+    dipakai. Aman dipanggil dari banyak thread: factory hanya jalan sekali."""
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                self._value = self.factory()
+                self._ready = True
+        return self._value
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def reset(self):
+        """Buang instance, dibuat ulang saat get() berikutnya (mis. setelah ganti config)."""
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+
+_registry: dict[str, LazyResource] = {}
+
+
+def lazy(name: str, factory) -> LazyResource:
+    resource = LazyResource(name, factory)
+    _registry[name] = resource
+    return resource
+
+
+def warm_up(names=None) -> dict:
+    """Buat resource sekarang (mis. saat startup server) supaya request
+    pertama tidak menanggung waktu koneksi / load model.
+
+    Resource yang gagal tidak menghentikan yang lain: error-nya dicatat dan
+    resource itu dicoba lagi saat get() berikutnya. Caller yang menentukan
+    apakah error fatal.
+    Return: dict name -> detik, atau exception kalau gagal."""
+    timings = {}
+    for name, resource in list(_registry.items()):
+        if names is not None and name not in names:
+            continue
+        start = time.perf_counter()
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"warm up {name} failed: {type(e).__name__}: {e}")
+            timings[name] = e
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
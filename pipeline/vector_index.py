@@ -0,0 +1,530 @@
+# pipeline/vector_index.py
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from pipeline.quantize import QuantizedMatrix, check_dtype
+from pipeline.query_cache import INDEX_VERSION_CHECK_EVERY
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+VECTOR_BACKEND = (os.getenv("VECTOR_BACKEND") or "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR") or str(BASE_DIR / "pipeline" / "index")
+# dtype dense.npy saat save(): float32, float16, atau int8 (+ dense_scales.npy)
+LOCAL_INDEX_DTYPE = check_dtype(os.getenv("LOCAL_INDEX_DTYPE"))
+
+
+class VectorIndex:
+    """Interface vector store yang dipakai RAG pipeline dan ingestion.
+
+    Query mengembalikan list of dict {"id", "score", "metadata", "values"},
+    fetch mengembalikan dict id -> values.
+    """
+
+    def query_dense(self, namespace: str, vector, top_k: int, include_values: bool = False) -> list[dict]:
+        raise NotImplementedError
+
+    def query_sparse(self, namespace: str, sparse_vector: dict, top_k: int) -> list[dict]:
+        raise NotImplementedError
+
+    def fetch(self, ids: list[str], namespace: str) -> dict:
+        raise NotImplementedError
+
+    def fetch_matrix(self, ids: list[str], namespace: str):
+        """Fetch vector langsung sebagai matrix float32 (baris i = ids[i]).
+        Return: (matrix, found) dengan found mask bool, baris yang tidak ada diisi nol."""
+        return _to_matrix(ids, self.fetch(ids, namespace))
+
+    def upsert_dense(self, vectors: list[dict], namespace: str):
+        raise NotImplementedError
+
+    def upsert_sparse(self, vectors: list[dict], namespace: str):
+        raise NotImplementedError
+
+    def delete(self, ids: list[str], namespace: str):
+        """Hapus vector dense dan sparse untuk `ids` di namespace."""
+        raise NotImplementedError
+
+    def save(self):
+        """Persist hasil upsert. Pinecone langsung tersimpan, jadi default no-op."""
+
+    def checkpoint(self) -> bool:
+        """Dipanggil ingestion di tiap checkpoint. Return True kalau semua upsert
+        sejauh ini sudah tersimpan, jadi manifest boleh di-checkpoint."""
+        self.save()
+        return True
+
+
+def coarse_namespace(namespace: str, dim: int) -> str:
+    """Namespace index Matryoshka `dim` dimensi untuk `namespace`, mis. ingredients-256d."""
+    return f"{namespace}-{dim}d"
+
+
+def truncate_vectors(vectors, dim: int) -> np.ndarray:
+    """Matryoshka: `dim` elemen pertama, dinormalisasi ulang (vector atau matrix)."""
+    out = np.array(np.asarray(vectors, dtype=np.float32)[..., :dim])
+    norms = np.linalg.norm(out, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+def _to_matrix(ids, id_to_values):
+    dim = next((len(v) for v in id_to_values.values() if v is not None), 0)
+    matrix = np.zeros((len(ids), dim), dtype=np.float32)
+    found = np.zeros(len(ids), dtype=bool)
+    for i, _id in enumerate(ids):
+        values = id_to_values.get(_id)
+        if values is not None:
+            matrix[i] = values
+            found[i] = True
+    return matrix, found
+
+
+def _match(item, include_values=True) -> dict:
+    return {
+        "id": item.get("id"),
+        "score": item.get("score", 0.0),
+        "metadata": item.get("metadata") or {},
+        "values": item.get("values") if include_values else None,
+    }
+
+
+class PineconeVectorIndex(VectorIndex):
+    """Implementasi VectorIndex di atas index dense + sparse Pinecone."""
+
+    def __init__(self, index_dense, index_sparse):
+        self.index_dense = index_dense
+        self.index_sparse = index_sparse
+
+    def query_dense(self, namespace, vector, top_k, include_values=False):
+        response = self.index_dense.query(
+            namespace=namespace,
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            include_values=include_values
+        )
+        return [_match(m, include_values) for m in (response.get("matches", []) or [])]
+
+    def query_sparse(self, namespace, sparse_vector, top_k):
+        response = self.index_sparse.query(
+            namespace=namespace,
+            sparse_vector=sparse_vector,
+            top_k=top_k,
+            include_metadata=True,
+            include_values=False
+        )
+        return [_match(m, False) for m in (response.get("matches", []) or [])]
+
+    def fetch(self, ids, namespace):
+        if not ids or not namespace:
+            return {}
+
+        fetched = self.index_dense.fetch(ids=ids, namespace=namespace) or {}
+        vectors_obj = fetched.vectors or {}
+
+        if isinstance(vectors_obj, dict):
+            vectors_map = vectors_obj
+        elif isinstance(vectors_obj, list):
+            vectors_map = {v.get("id"): v for v in vectors_obj if v and v.get("id")}
+        else:
+            vectors_map = {}
+
+        # Ekstrak values
+        out = {}
+        for _id, rec in vectors_map.items():
+            if not rec:
+                continue
+            values = rec.get("values")
+            if values is None:
+                values = (rec.get("vector") or {}).get("values")
+            if values is not None:
+                out[_id] = values
+        return out
+
+    def upsert_dense(self, vectors, namespace):
+        self.index_dense.upsert(vectors=vectors, namespace=namespace)
+
+    def upsert_sparse(self, vectors, namespace):
+        self.index_sparse.upsert(vectors=vectors, namespace=namespace)
+
+    def delete(self, ids, namespace):
+        if not ids:
+            return
+        self.index_dense.delete(ids=ids, namespace=namespace)
+        if self.index_sparse is not None:
+            # index coarse (two-stage search) tidak punya pasangan sparse
+            self.index_sparse.delete(ids=ids, namespace=namespace)
+
+
+class _DenseNamespace:
+    """Matrix (memory-mapped, float32 / float16 / int8) + norms untuk satu namespace."""
+
+    def __init__(self, ids, matrix: QuantizedMatrix, metadata):
+        self.ids = list(ids)
+        self.pos = {_id: i for i, _id in enumerate(self.ids)}
+        self.matrix = matrix
+        norms = matrix.row_norms() if len(self.ids) else np.zeros(0, dtype=np.float32)
+        norms[norms == 0] = 1.0
+        self.inv_norms = (1.0 / norms).astype(np.float32)
+        self.metadata = metadata
+
+
+class _SparseNamespace:
+    """Inverted index: term -> (posisi dokumen, bobot), disusun seperti CSR."""
+
+    def __init__(self, ids, terms, offsets, postings, weights, metadata):
+        self.ids = list(ids)
+        self.terms = terms          # uint32, sorted
+        self.offsets = offsets      # int64, len(terms) + 1
+        self.postings = postings    # int32 posisi dokumen
+        self.weights = weights      # float32
+        self.metadata = metadata
+
+    @classmethod
+    def build(cls, ids, sparse_values, metadata):
+        n_terms = sum(len(sv["indices"]) for sv in sparse_values)
+        term_arr = np.empty(n_terms, dtype=np.uint32)
+        doc_arr = np.empty(n_terms, dtype=np.int32)
+        weight_arr = np.empty(n_terms, dtype=np.float32)
+        k = 0
+        for doc, sv in enumerate(sparse_values):
+            n = len(sv["indices"])
+            term_arr[k:k + n] = sv["indices"]
+            doc_arr[k:k + n] = doc
+            weight_arr[k:k + n] = sv["values"]
+            k += n
+        order = np.argsort(term_arr, kind="stable")
+        term_arr, doc_arr, weight_arr = term_arr[order], doc_arr[order], weight_arr[order]
+        terms, starts = np.unique(term_arr, return_index=True)
+        offsets = np.append(starts, len(term_arr)).astype(np.int64)
+        return cls(ids, terms, offsets, doc_arr, weight_arr, metadata)
+
+
+def _topk(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Index top-k (urut skor turun) pakai argpartition."""
+    if top_k <= 0 or len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k < len(scores):
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class LocalVectorIndex(VectorIndex):
+    """VectorIndex in-process: exact top-k dengan matmul, tanpa network.
+
+    Layout di disk per namespace (`root/<namespace>/`), semua file per generasi `<gen>`:
+      index.json: {"dense": gen, "sparse": gen}, satu-satunya file yang ditimpa
+      dense_ids.<gen>.json, dense.<gen>.npy (LOCAL_INDEX_DTYPE, di-load dengan mmap), dense_meta.<gen>.json,
+      dense_scales.<gen>.npy (scale per baris, hanya untuk int8)
+      sparse_ids.<gen>.json, sparse.<gen>.npz (inverted index), sparse_meta.<gen>.json
+    save() menulis generasi baru lalu mengganti index.json dengan os.replace, jadi
+    reader (proses lain, mmap) selalu melihat satu generasi yang utuh; reader
+    mengecek index.json tiap INDEX_VERSION_CHECK_EVERY detik dan load ulang kalau
+    generasinya berubah. Layout lama tanpa index.json (dense.npy, ...) tetap bisa dibaca.
+    Dense memakai metric cosine, sparse memakai dotproduct (sama seperti index Pinecone).
+    """
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR, dtype: str = LOCAL_INDEX_DTYPE):
+        self.root = Path(root)
+        self.dtype = check_dtype(dtype)
+        # namespace -> (generasi, data)
+        self._dense: dict[str, tuple] = {}
+        self._sparse: dict[str, tuple] = {}
+        # (dense|sparse, namespace) -> waktu terakhir index.json dicek
+        self._checked: dict[tuple[str, str], float] = {}
+        # data upsert yang belum di-save: namespace -> id -> record
+        self._pending_dense: dict[str, dict] = {}
+        self._pending_sparse: dict[str, dict] = {}
+        self._pending_delete: dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    # ---------- load ----------
+    def _ns_dir(self, namespace) -> Path:
+        return self.root / (namespace or "__default__")
+
+    @staticmethod
+    def _file(d: Path, name: str, gen: str, suffix: str) -> Path:
+        # gen "" = layout lama tanpa generasi
+        return d / (f"{name}.{gen}{suffix}" if gen else f"{name}{suffix}")
+
+    def _generations(self, namespace) -> dict:
+        """Generasi dense/sparse yang sedang aktif (None = belum ada)."""
+        d = self._ns_dir(namespace)
+        try:
+            return json.loads((d / "index.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"dense": "" if (d / "dense.npy").exists() else None,
+                    "sparse": "" if (d / "sparse.npz").exists() else None}
+
+    def _cached(self, cache: dict, namespace, kind: str, load):
+        entry = cache.get(namespace)
+        now = time.monotonic()
+        if entry is not None and now - self._checked.get((kind, namespace), 0.0) < INDEX_VERSION_CHECK_EVERY:
+            return entry[1]
+        with self._lock:
+            gen = self._generations(namespace).get(kind)
+            entry = cache.get(namespace)
+            if entry is None or entry[0] != gen:
+                entry = (gen, load(self._ns_dir(namespace), gen))
+                cache[namespace] = entry
+            self._checked[(kind, namespace)] = now
+        return entry[1]
+
+    def _dense_ns(self, namespace) -> _DenseNamespace:
+        return self._cached(self._dense, namespace, "dense", self._load_dense)
+
+    def _sparse_ns(self, namespace) -> _SparseNamespace:
+        return self._cached(self._sparse, namespace, "sparse", self._load_sparse)
+
+    def _load_dense(self, d: Path, gen) -> _DenseNamespace:
+        if gen is None:
+            return _DenseNamespace([], QuantizedMatrix(np.zeros((0, 0), dtype=np.float32)), {})
+        ids = json.loads(self._file(d, "dense_ids", gen, ".json").read_text(encoding="utf-8"))
+        scales_path = self._file(d, "dense_scales", gen, ".npy")
+        matrix = QuantizedMatrix(np.load(self._file(d, "dense", gen, ".npy"), mmap_mode="r"),
+                                 np.load(scales_path) if scales_path.exists() else None)
+        meta_path = self._file(d, "dense_meta", gen, ".json")
+        metadata = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        return _DenseNamespace(ids, matrix, metadata)
+
+    def _load_sparse(self, d: Path, gen) -> _SparseNamespace:
+        if gen is None:
+            return _SparseNamespace.build([], [], {})
+        ids = json.loads(self._file(d, "sparse_ids", gen, ".json").read_text(encoding="utf-8"))
+        data = np.load(self._file(d, "sparse", gen, ".npz"))
+        meta_path = self._file(d, "sparse_meta", gen, ".json")
+        metadata = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        return _SparseNamespace(ids, data["terms"], data["offsets"], data["postings"], data["weights"], metadata)
+
+    # ---------- query ----------
+    def query_dense(self, namespace, vector, top_k, include_values=False):
+        ns = self._dense_ns(namespace)
+        if not ns.ids or vector is None:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        scores = ns.matrix.matmul(q) * ns.inv_norms / (q_norm or 1.0)
+        return [{
+            "id": ns.ids[i],
+            "score": float(scores[i]),
+            "metadata": ns.metadata.get(ns.ids[i], {}),
+            "values": ns.matrix[i].tolist() if include_values else None,
+        } for i in _topk(scores, top_k)]
+
+    def query_sparse(self, namespace, sparse_vector, top_k):
+        ns = self._sparse_ns(namespace)
+        # namespace tanpa posting (semua dokumen kosong) tidak bisa match apa pun
+        if not ns.ids or not len(ns.terms) or not sparse_vector or not sparse_vector.get("indices"):
+            return []
+        q_terms = np.asarray(sparse_vector["indices"], dtype=np.uint32)
+        q_weights = np.asarray(sparse_vector["values"], dtype=np.float32)
+
+        pos = np.minimum(np.searchsorted(ns.terms, q_terms), len(ns.terms) - 1)
+        found = ns.terms[pos] == q_terms
+        scores = np.zeros(len(ns.ids), dtype=np.float32)
+        touched = np.zeros(len(ns.ids), dtype=bool)
+        for p, w in zip(pos[found], q_weights[found]):
+            start, end = ns.offsets[p], ns.offsets[p + 1]
+            docs = ns.postings[start:end]
+            scores[docs] += w * ns.weights[start:end]
+            touched[docs] = True
+
+        # seperti Pinecone, hanya dokumen yang punya term yang sama
+        candidates = np.flatnonzero(touched)
+        order = candidates[_topk(scores[candidates], top_k)]
+        return [{
+            "id": ns.ids[i],
+            "score": float(scores[i]),
+            "metadata": ns.metadata.get(ns.ids[i], {}),
+            "values": None,
+        } for i in order]
+
+    def fetch(self, ids, namespace):
+        if not ids or not namespace:
+            return {}
+        ns = self._dense_ns(namespace)
+        return {_id: ns.matrix[ns.pos[_id]].tolist() for _id in ids if _id in ns.pos}
+
+    def fetch_matrix(self, ids, namespace):
+        ns = self._dense_ns(namespace) if namespace else None
+        if not ids or ns is None or not ns.ids:
+            return np.zeros((len(ids), 0), dtype=np.float32), np.zeros(len(ids), dtype=bool)
+        positions = np.array([ns.pos.get(_id, -1) for _id in ids], dtype=np.int64)
+        found = positions >= 0
+        # fancy indexing ke mmap: hanya baris yang diminta yang dibaca, tanpa list python
+        matrix = np.zeros((len(ids), ns.matrix.shape[1]), dtype=np.float32)
+        matrix[found] = ns.matrix[positions[found]]
+        return matrix, found
+
+    # ---------- write ----------
+    def upsert_dense(self, vectors, namespace):
+        with self._write_lock:
+            pending = self._pending_dense.setdefault(namespace, {})
+            for v in vectors:
+                pending[v["id"]] = v
+
+    def upsert_sparse(self, vectors, namespace):
+        with self._write_lock:
+            pending = self._pending_sparse.setdefault(namespace, {})
+            for v in vectors:
+                pending[v["id"]] = v
+
+    def delete(self, ids, namespace):
+        with self._write_lock:
+            self._pending_delete.setdefault(namespace, set()).update(ids)
+            for pending in (self._pending_dense, self._pending_sparse):
+                for _id in ids:
+                    pending.get(namespace, {}).pop(_id, None)
+
+    def save(self):
+        """Gabungkan data yang sudah ada dengan hasil upsert/delete lalu tulis ke disk."""
+        with self._write_lock:
+            self._save()
+
+    def checkpoint(self) -> bool:
+        """save() menulis ulang seluruh namespace, jadi di tengah ingestion hanya
+        di-save kalau data pending minimal sebanyak yang sudah ada di disk. Ukuran
+        index (minimal) dua kali lipat tiap save, total biaya tetap O(N), bukan O(N^2)."""
+        with self._write_lock:
+            pending = sum(len(p) for p in self._pending_dense.values()) + \
+                sum(len(p) for p in self._pending_delete.values())
+            if not pending:
+                return True
+            stored = sum(len(self._dense_ns(ns).ids) for ns in self._pending_dense)
+            if pending < stored:
+                return False
+            self._save()
+            return True
+
+    def _save(self):
+        for namespace in self._pending_delete:
+            # namespace yang hanya kena delete tetap harus ditulis ulang
+            self._pending_dense.setdefault(namespace, {})
+            self._pending_sparse.setdefault(namespace, {})
+
+        for namespace in set(self._pending_dense) | set(self._pending_sparse):
+            d = self._ns_dir(namespace)
+            current = self._generations(namespace)
+            gen = f"{time.time_ns():x}"
+            new = dict(current)
+            if namespace in self._pending_dense:
+                written = self._write_dense(d, gen, namespace, current.get("dense"))
+                if written:
+                    new["dense"] = gen
+            if namespace in self._pending_sparse:
+                written = self._write_sparse(d, gen, namespace, current.get("sparse"))
+                if written:
+                    new["sparse"] = gen
+            if new == current:
+                continue
+            # satu os.replace: reader melihat generasi lama atau baru, tidak pernah campuran
+            _write_atomic(d / "index.json", json.dumps(new).encode("utf-8"))
+            self._dense.pop(namespace, None)
+            self._sparse.pop(namespace, None)
+            self._remove_old_generations(d, keep={current.get("dense"), current.get("sparse"),
+                                                  new["dense"], new["sparse"]})
+
+        self._pending_dense = {}
+        self._pending_sparse = {}
+        self._pending_delete = {}
+
+    def _write_dense(self, d: Path, gen: str, namespace, current_gen) -> bool:
+        ns = self._load_dense(d, current_gen)
+        pending = self._pending_dense[namespace]
+        existing = ns.matrix.to_float32() if ns.ids else None
+        records = {_id: (existing[i], ns.metadata.get(_id)) for _id, i in ns.pos.items()}
+        for _id, v in pending.items():
+            records[_id] = (v["values"], v.get("metadata"))
+        for _id in self._pending_delete.get(namespace, ()):
+            records.pop(_id, None)
+        if not records and current_gen is None:
+            return False
+        ids = list(records)
+        matrix = QuantizedMatrix.from_float([records[_id][0] for _id in ids], self.dtype)
+        metadata = {_id: records[_id][1] for _id in ids if records[_id][1]}
+
+        d.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._file(d, "dense", gen, ".npy"), lambda f: np.save(f, matrix.data))
+        if matrix.scales is not None:
+            _write_atomic(self._file(d, "dense_scales", gen, ".npy"), lambda f: np.save(f, matrix.scales))
+        _write_atomic(self._file(d, "dense_ids", gen, ".json"), json.dumps(ids).encode("utf-8"))
+        _write_atomic(self._file(d, "dense_meta", gen, ".json"), json.dumps(metadata).encode("utf-8"))
+        return True
+
+    def _write_sparse(self, d: Path, gen: str, namespace, current_gen) -> bool:
+        ns = self._load_sparse(d, current_gen)
+        pending = self._pending_sparse[namespace]
+        records = {}
+        if ns.ids:
+            # rekonstruksi sparse vector per dokumen dari inverted index
+            term_of = np.repeat(ns.terms, np.diff(ns.offsets))
+            order = np.argsort(ns.postings, kind="stable")
+            bounds = np.searchsorted(ns.postings[order], np.arange(len(ns.ids) + 1))
+            for i, _id in enumerate(ns.ids):
+                sel = order[bounds[i]:bounds[i + 1]]
+                records[_id] = ({"indices": term_of[sel].tolist(), "values": ns.weights[sel].tolist()},
+                                ns.metadata.get(_id))
+        for _id, v in pending.items():
+            records[_id] = (v["sparse_values"], v.get("metadata"))
+        for _id in self._pending_delete.get(namespace, ()):
+            records.pop(_id, None)
+        if not records and current_gen is None:
+            return False
+        ids = list(records)
+        built = _SparseNamespace.build(ids, [records[_id][0] for _id in ids], {})
+        metadata = {_id: records[_id][1] for _id in ids if records[_id][1]}
+
+        d.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._file(d, "sparse", gen, ".npz"),
+                      lambda f: np.savez(f, terms=built.terms, offsets=built.offsets,
+                                         postings=built.postings, weights=built.weights))
+        _write_atomic(self._file(d, "sparse_ids", gen, ".json"), json.dumps(ids).encode("utf-8"))
+        _write_atomic(self._file(d, "sparse_meta", gen, ".json"), json.dumps(metadata).encode("utf-8"))
+        return True
+
+    def _remove_old_generations(self, d: Path, keep: set):
+        """Hapus file generasi lama. Generasi sebelumnya disimpan supaya reader
+        yang baru membaca index.json lama masih bisa membuka file-nya."""
+        for path in d.iterdir():
+            parts = path.name.split(".")
+            if path.name == "index.json" or path.name.endswith(".tmp"):
+                continue
+            gen = parts[1] if len(parts) == 3 else ""
+            if gen in keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                # mis. masih di-mmap di Windows, dicoba lagi di save berikutnya
+                pass
+
+
+def _write_atomic(path: Path, data):
+    """Tulis ke file tmp di folder yang sama lalu os.replace.
+    `data`: bytes, atau fungsi yang menulis ke file object."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        if callable(data):
+            data(f)
+        else:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def get_vector_index(index_dense=None, index_sparse=None) -> VectorIndex:
+    """Pilih backend dari env VECTOR_BACKEND ("pinecone" atau "local")."""
+    if VECTOR_BACKEND == "local":
+        return LocalVectorIndex(LOCAL_INDEX_DIR, LOCAL_INDEX_DTYPE)
+    return PineconeVectorIndex(index_dense, index_sparse)
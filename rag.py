@@ -1,14 +1,62 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from AlgorithmClass import AlgorithmClass
-from pipeline.rag_pipeline import RAG_pipeline
+from pipeline.rag_pipeline import (
+    RAG_pipeline,
+    attach_hydration_vectors,
+    cache_results,
+    get_cached_results,
+    get_recipe_metadata,
+    hydrate_candidates,
+    retrieve_candidates,
+)
+from pipeline.query_context import QueryContext
+
+# hydrate kandidat di background selama resep pertama sudah ditampilkan
+_hydrate_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hydrate")
 
 
 class Datahandle:
-    def get_recipes(self, query: str):
+    def get_query_context(self, query: str) -> QueryContext:
+        '''
+        Input: text input (str)
+        Output: QueryContext, embedding query dihitung sekali dan dipakai ulang'''
+        return QueryContext(query)
+
+    def get_recipes(self, query: str, ctx: QueryContext = None, mode: str = None):
         # get top 50 recipe based on query from vector db
-        output_recipes = RAG_pipeline(query)
+        output_recipes = RAG_pipeline(query, ctx, mode)
         return output_recipes
 
+    def get_cached_recipes(self, query: str, mode: str = None):
+        '''
+        Output: hasil get_recipes dari cache query, None kalau belum ada'''
+        return get_cached_results(query, mode)
+
+    def cache_recipes(self, query: str, recipes, mode: str = None):
+        cache_results(query, recipes, mode)
+
+    def retrieve_candidates(self, query: str, ctx: QueryContext = None, mode: str = None):
+        '''
+        Input: text input (str), mode retrieval (sparse/dense/hybrid/weighted)
+        Output: kandidat (id, similarity, values) tanpa metadata dan vector all-text'''
+        return retrieve_candidates(query, ctx, mode)
+
+    def attach_vectors(self, candidates):
+        '''
+        Input: output retrieve_candidates
+        Output: kandidat yang sama, dengan vector all-text / final vector (tanpa metadata)'''
+        return attach_hydration_vectors(candidates)
+
+    def hydrate_candidates_async(self, candidates):
+        '''
+        Input: output retrieve_candidates
+        Output: Future -> list of recipes, sama seperti get_recipes'''
+        return _hydrate_executor.submit(hydrate_candidates, candidates)
+
+    def get_recipe_metadata(self, recipe_id: str):
+        return get_recipe_metadata(recipe_id)
+
     # ini ganti sama embedding sesuai maneh pake model apa untuk embeddingnya
     def get_embeddings_input(self, text_input):
         '''
@@ -1,7 +1,9 @@
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
+from email.utils import parsedate_to_datetime
 from bs4 import BeautifulSoup
-import json, time, random, sys
+import asyncio, json, time, random, sys, threading
+import httpx
 
 # url
 BASE_URL = "https://cookpad.com/"
@@ -15,6 +17,16 @@ PLATEAU_ROUNDS = 5                  # max number of retry to get additional reci
 NETWORK_PAUSE = (0.7, 1.3)          # random delay number
 OUTFILE = "cookpad_recipe_all.json" # output filename
 
+# recipe page fetching (async engine)
+FETCH_WORKERS = 8                   # number of recipe pages fetched at the same time
+RATE_PER_HOST = 2.0                 # allowed requests per second per host
+RATE_BURST = 4                      # token bucket size (short bursts above the rate)
+MAX_ATTEMPTS = 4                    # attempts per url (first try + retries)
+BACKOFF_BASE = 1.0                  # first retry delay in seconds
+BACKOFF_FACTOR = 1.8                # delay multiplier per retry
+BACKOFF_MAX = 60.0                  # cap for retry delay / Retry-After
+RETRY_STATUS = (400, 403, 429)      # plus every 5xx
+
 # browser identifier
 UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
       "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -212,25 +224,50 @@ def parse_data(html: str, url: str):
         "steps": parse_steps(data.get("recipeInstructions"))
     }
 
-# get html of recipe data
+# request headers for recipe pages
+REQUEST_HEADERS = {
+    "User-Agent": UA,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "id,en-US;q=0.8,en;q=0.6",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+}
+
+def should_retry(status: int) -> bool:
+    return status in RETRY_STATUS or status >= 500
+
+# delay before the next attempt: Retry-After from the server if any, else exponential backoff + jitter
+def retry_delay(attempt: int, retry_after=None) -> float:
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = 0.0
+        if delay > 0:
+            return min(delay, BACKOFF_MAX)
+    delay = BACKOFF_BASE * BACKOFF_FACTOR ** attempt
+    return min(delay * random.uniform(0.8, 1.2), BACKOFF_MAX)
+
+def bad_response(status, snippet):
+    err = f"{status} Bad Response"
+    if snippet:
+        err += f" | body: {snippet!r}"
+    return {"url": None, "error": err}
+
+# get html of recipe data (sync, one request at a time; see FetchEngine for bulk fetching)
 def fetch_recipe_data(ctx, url, referer="https://cookpad.com/id"):
-    headers = {
-        "User-Agent": UA,
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "id,en-US;q=0.8,en;q=0.6",
-        "Referer": referer,
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1",
-        "Cache-Control": "no-cache",
-        "Pragma": "no-cache",
-    }
+    headers = {**REQUEST_HEADERS, "Referer": referer}
 
-    backoff = 1.0
     last_status = None
     last_snippet = None
 
     # iterate to retry if failed to fetch
-    for attempt in range(4):
+    for attempt in range(MAX_ATTEMPTS):
         # get html data of the url
         resp = ctx.request.get(url, headers=headers, timeout=20000)
         last_status = resp.status
@@ -238,7 +275,7 @@ def fetch_recipe_data(ctx, url, referer="https://cookpad.com/id"):
             # parse the html data
             html = resp.text()
             return parse_data(html, url)
-        
+
         # get text for return data
         try:
             txt = resp.text() or ""
@@ -247,20 +284,158 @@ def fetch_recipe_data(ctx, url, referer="https://cookpad.com/id"):
             last_snippet = None
 
         # retry for 400/403/429/500+
-        if resp.status in (400, 403, 429) or resp.status >= 500:
-            time.sleep(backoff)
-            backoff *= 1.8
+        if should_retry(resp.status) and attempt + 1 < MAX_ATTEMPTS:
+            time.sleep(retry_delay(attempt, resp.headers.get("retry-after")))
             continue
         break
 
     # return status if error
-    err = f"{last_status} Bad Response"
-    if last_snippet:
-        err += f" | body: {last_snippet!r}"
-    return {"url": url, "error": err}
+    return {**bad_response(last_status, last_snippet), "url": url}
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `burst` at once.
+    `pause(seconds)` blocks every caller (shared backoff after 429/5xx)."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchEngine:
+    """Fetch recipe pages concurrently with async httpx in a background thread.
+
+    FETCH_WORKERS workers pull urls from a queue; every request takes a token
+    from the bucket of its host (RATE_PER_HOST), so throughput follows the
+    allowed rate instead of round-trip latency. A 429/5xx pauses the whole
+    host (shared backoff), then the url is retried up to MAX_ATTEMPTS.
+
+    Usage: start(cookies) -> submit(url, referer, category)... -> close() -> results
+    """
+
+    def __init__(self, workers=FETCH_WORKERS, rate=RATE_PER_HOST, burst=RATE_BURST):
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.results = []
+        self.n_done = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.buckets = {}
+        self.queue = None
+        self.tasks = []
+        self.client = None
+
+    def bucket(self, url) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    def start(self, cookies=()):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(cookies), self.loop).result()
+        return self
+
+    async def _start(self, cookies):
+        jar = httpx.Cookies()
+        # reuse the browser session cookies (consent, anti-bot) from playwright
+        for c in cookies:
+            jar.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        self.client = httpx.AsyncClient(
+            headers=REQUEST_HEADERS, cookies=jar, timeout=20.0, follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers))
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, url, referer, category):
+        # results keep submit order
+        slot = len(self.results)
+        self.results.append(None)
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (slot, url, referer, category))
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        return self.results
+
+    async def _close(self):
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.client.aclose()
+
+    async def _worker(self):
+        while True:
+            slot, url, referer, category = await self.queue.get()
+            try:
+                data = await self.fetch(url, referer)
+            except Exception as e:
+                data = {"url": url, "error": f"{type(e).__name__}: {e}"}
+            finally:
+                self.queue.task_done()
+            data['category'] = category
+            self.results[slot] = data
+            self.n_done += 1
+            # logging
+            if self.n_done % 10 == 0:
+                print(f"{self.n_done} data succesfully collected")
+
+    async def fetch(self, url, referer):
+        bucket = self.bucket(url)
+        last_status = None
+        last_snippet = None
+        for attempt in range(MAX_ATTEMPTS):
+            await bucket.acquire()
+            try:
+                resp = await self.client.get(url, headers={"Referer": referer})
+            except httpx.TransportError as e:
+                last_status, last_snippet = type(e).__name__, None
+                await asyncio.sleep(retry_delay(attempt))
+                continue
+
+            last_status = resp.status_code
+            if resp.is_success:
+                # parsing is cpu work, keep the event loop free for other requests
+                return await asyncio.to_thread(parse_data, resp.text, url)
+
+            last_snippet = resp.text[:300] if resp.text else None
+            if not should_retry(resp.status_code) or attempt + 1 >= MAX_ATTEMPTS:
+                break
+            delay = retry_delay(attempt, resp.headers.get("retry-after"))
+            if resp.status_code == 429 or resp.status_code >= 500:
+                # server is overloaded / rate limiting us: slow down every worker on this host
+                bucket.pause(delay)
+            await asyncio.sleep(delay)
+
+        return {**bad_response(last_status, last_snippet), "url": url}
 
 def main():
-    all_results = []
+    engine = FetchEngine()
 
     with sync_playwright() as p:
         # launch page and go to start url
@@ -272,6 +447,8 @@ def main():
         )
         page = ctx.new_page()
         page.goto(START_URL, wait_until="domcontentloaded", timeout=60_000)
+        # recipe pages are fetched in the background while categories are crawled
+        engine.start(ctx.cookies())
 
         # scrape category url from main page
         category_urls = get_category_links(page)
@@ -290,27 +467,20 @@ def main():
             category = cat.split('/')[-1] # get category from url
             print(f"Total Data: {len(recipe_urls)}")
 
-            # iterate from recipe data
-            for i, url in enumerate(recipe_urls, 1):
+            # queue recipe data for the fetch engine
+            for url in recipe_urls:
                 # skip duplicate urk 
                 if url in total_seen:
                     continue
-                # add url and wait
                 total_seen.add(url)
-                polite_wait()
-
-                # get needed data from recipe
-                data = fetch_recipe_data(ctx, url, referer=cat)
-                data['category'] = category
-                all_results.append(data)
-
-                # logging
-                if i % 10 == 0:
-                    print(f"{i} data succesfully collected")
+                engine.submit(url, referer=cat, category=category)
 
         # close all pages
         browser.close()
 
+    # wait for the remaining recipe pages
+    all_results = engine.close()
+
     with open(OUTFILE, "w", encoding="utf-8") as f:
         json.dump(all_results, f, ensure_ascii=False, indent=2)
 
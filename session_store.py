@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """State per user (mis. AlgorithmClass) berdasarkan session id.
+
+    Session yang tidak aktif lebih dari `ttl` detik dibuang. Kalau jumlah
+    session atau total memory (dihitung lewat `sizeof`) melewati batas,
+    session yang paling lama tidak dipakai dibuang duluan.
+    """
+
+    def __init__(self, factory, ttl=1800, max_sessions=500, max_bytes=None, sizeof=None):
+        self.factory = factory
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._sessions = OrderedDict()  # session_id -> (state, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return state session, None kalau belum ada atau sudah expired."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (entry[0], time.monotonic())
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def get_or_create(self, session_id):
+        with self._lock:
+            self._evict_expired()
+            entry = self._sessions.get(session_id)
+            state = entry[0] if entry is not None else self.factory()
+            self._sessions[session_id] = (state, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            self._evict_over_capacity(keep=session_id)
+            return state
+
+    def touch(self, session_id):
+        """Dipanggil setelah state berubah (mis. ukuran pool berubah) untuk cek batas memory."""
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id] = (self._sessions[session_id][0], time.monotonic())
+                self._sessions.move_to_end(session_id)
+            self._evict_over_capacity(keep=session_id)
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def nbytes(self):
+        if self.sizeof is None:
+            return 0
+        return sum(self.sizeof(state) for state, _ in self._sessions.values())
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        # OrderedDict urut dari yang paling lama dipakai
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def _evict_over_capacity(self, keep=None):
+        while len(self._sessions) > self.max_sessions:
+            if not self._pop_oldest(keep):
+                break
+        if self.max_bytes is not None and self.sizeof is not None:
+            while self.nbytes() > self.max_bytes:
+                if not self._pop_oldest(keep):
+                    break
+
+    def _pop_oldest(self, keep):
+        for session_id in self._sessions:
+            if session_id != keep:
+                del self._sessions[session_id]
+                return True
+        return False
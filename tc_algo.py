@@ -1,16 +1,104 @@
 import unittest
-from sentence_transformers import SentenceTransformer
-from AlgorithmClass import AlgorithmClass
-from rag import embed_rag
-import json
+import sys
+from pathlib import Path
+import numpy as np
+
+# offline: resep + vector dari fixture synthetic (benchmarks/fixtures.py), env di-set sebelum import pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parent / "benchmarks"))
+from run import configure, synthetic_fixture  # noqa: E402
+
+FIXTURE = synthetic_fixture()
+META = configure(FIXTURE)
+
+from AlgorithmClass import AlgorithmClass  # noqa: E402
+from fixtures import HashingEmbedder  # noqa: E402
+from mapping import MappingOutput  # noqa: E402
+from pipeline.vector_index import LocalVectorIndex  # noqa: E402
+import json  # noqa: E402
+
+
+def load_recipes_with_vectors():
+    ''' Resep fixture + vector bahan (values) dan all-text (vector_all) dari index fixture,
+    bentuknya sama seperti hasil RAG_pipeline.'''
+    with open(FIXTURE / 'recipes' / 'recipes.json', 'r', encoding='utf-8') as f:
+        recipes = json.load(f)
+    index = LocalVectorIndex(FIXTURE / 'index')
+    ids = [r['id'] for r in recipes]
+    values, _ = index.fetch_matrix(ids, META['namespace'])
+    vector_all, _ = index.fetch_matrix(ids, META['namespace2'])
+    for recipe, v, v_all in zip(recipes, values, vector_all):
+        recipe['values'] = v
+        recipe['vector_all'] = v_all
+    return recipes
+
+
+class ReferenceAlgorithm:
+    ''' Loop MMR versi lama (list of MappingOutput), pembanding MMREngine / CandidatePool.
+    Disalin apa adanya, termasuk tipe datanya: user_pref list (float64), final vector float32.'''
+
+    def __init__(self, recipes, user_pref):
+        self.user_pref = user_pref
+        self.selected = []
+        self.current_item_embeddding = None
+        self.candidates = [
+            MappingOutput(title=r['title'], image=r.get('image'), ingredients=r.get('ingredients'),
+                          steps=r.get('steps'), ingredients_vector=r['values'], all_vector=r['vector_all'],
+                          final_vector=self.rerank_ingredients(r['vector_all'], r['values'], lambd=0.5))
+            for r in recipes]
+
+    def rerank_ingredients(self, embed_all, embed_ingredients, lambd=0.7):
+        e1 = np.asarray(embed_ingredients, dtype=np.float32)
+        e2 = np.asarray(embed_all, dtype=np.float32)
+        return lambd * e1 + (1.0 - lambd) * e2
+
+    def cosine_similarity(self, a, b):
+        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+    def update_user_pref(self, user_pref, item_embedding, rating, lr=0.5):
+        if rating == 0:
+            return user_pref
+        return user_pref + lr * rating * (item_embedding - user_pref)
+
+    def rating_recipe(self, rating):
+        self.user_pref = self.update_user_pref(
+            self.user_pref, self.current_item_embeddding, rating, lr=0.1)
+        if self.candidates == []:
+            self.candidates = self.selected.copy()
+            self.selected = []
+        best = self.mmr_rerank(lambd=0.99, top_k=1)[0]
+        self.current_item_embeddding = best.final_vector
+        return best.title
+
+    def mmr_rerank(self, lambd=0.7, top_k=1):
+        bests = []
+        while len(bests) < top_k and self.candidates:
+            scores = []
+            for candidate in self.candidates:
+                sim_to_user = self.cosine_similarity(
+                    self.user_pref, candidate.final_vector)
+                sim_to_selected = max([self.cosine_similarity(
+                    candidate.final_vector, s.final_vector) for s in self.selected], default=0)
+                score = lambd * sim_to_user - (1 - lambd) * sim_to_selected
+                scores.append((score, candidate))
+            scores.sort(key=lambda x: x[0], reverse=True)
+            best = scores[0][1]
+            self.selected.append(best)
+            bests.append(best)
+            self.candidates.remove(best)
+        return bests
 
 
 class TestAlgorithm(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.all_recipes = load_recipes_with_vectors()
+        cls.embed = HashingEmbedder(META['dim'])
+
     def setUp(self):
-        json_file_path = './data/raw/cookpad_recipe_ayam.json'
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            self.recipes = json.load(f)
+        self.recipes = self.all_recipes
         self.algorithm = AlgorithmClass()
+        # embedding query tanpa API: embedder yang sama dengan fixture
+        self.algorithm.generate_input_embedding = lambda text: self.embed([text])[0]
 
     def test_output_mapping(self):
         recipes = self.recipes[:10]
@@ -63,6 +151,40 @@ class TestAlgorithm(unittest.TestCase):
             for ing in result['ingredients']:
                 print(f"- {ing}")
 
+    def test_mmr_matches_reference_loop(self):
+        ''' MMREngine + CandidatePool memberi urutan rekomendasi yang sama dengan
+        loop list versi lama, termasuk saat semua kandidat habis dan di-recycle.'''
+        rating = [-1, 1, 5, 3, -5, 0, 2]
+        queries = ["kecap manis", "ayam bawang putih", "cabai tomat", "santan kunyit", "ayam goreng", "jahe"]
+        for start in range(0, len(self.recipes) - 12, 12):
+            recipes = self.recipes[start:start + 12]
+            input_text = queries[(start // 12) % len(queries)]
+            # list python seperti output get_dense_embeddings
+            user_pref = self.embed([input_text])[0]
+            reference = ReferenceAlgorithm(recipes, user_pref)
+
+            self.algorithm.reset()
+            self.algorithm.mapping_input(input_text, user_pref)
+            self.algorithm.mapping_output(recipes)
+            expected = [reference.rating_recipe(0)]
+            got = [self.algorithm.first_generate_recipe()['title']]
+            # lebih dari jumlah kandidat, supaya recycle ikut dicek
+            for step in range(30):
+                expected.append(reference.rating_recipe(rating[step % len(rating)]))
+                got.append(self.algorithm.rating_recipe(rating[step % len(rating)])['title'])
+            self.assertEqual(got, expected, (start, input_text))
+
+    def test_mmr_near_tie_scored_in_float64(self):
+        ''' Dua kandidat yang seri kalau relevansi dihitung float32: versi lama
+        (float64) memilih yang lebih dekat ke user, bukan yang urutannya pertama.'''
+        from mmr import MMREngine
+        user_pref = [1.0, 0.0, 1e-6]
+        vectors = [[1.0, 0.0, 0.0], [1.0, 0.0, 1e-6]]
+        reference = ReferenceAlgorithm([{'title': str(i), 'values': v, 'vector_all': v}
+                                        for i, v in enumerate(vectors)], user_pref)
+        self.assertEqual(reference.rating_recipe(0), '1')
+        self.assertEqual(MMREngine(vectors).select(user_pref, 0.99), 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,187 @@
+import unittest
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+import numpy as np
+
+# offline: local index + BM25 + embedding query yang direkam dari fixture synthetic
+sys.path.insert(0, str(Path(__file__).resolve().parent / "benchmarks"))
+from run import configure, synthetic_fixture  # noqa: E402
+
+FIXTURE = synthetic_fixture()
+META = configure(FIXTURE)
+
+from pinecone_text.sparse import BM25Encoder  # noqa: E402
+from pipeline.bm25_model import CompiledBM25, compile_bm25, load_bm25_encoder  # noqa: E402
+from pipeline.query_cache import QueryCache  # noqa: E402
+from pipeline.query_context import QueryContext  # noqa: E402
+from pipeline.vector_index import LocalVectorIndex  # noqa: E402
+import pipeline.rag_pipeline as rp  # noqa: E402
+from rag import Datahandle  # noqa: E402
+from AlgorithmClass import AlgorithmClass  # noqa: E402
+
+
+def load_queries():
+    with open(FIXTURE / 'queries.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_texts():
+    with open(FIXTURE / 'recipes' / 'recipes.json', 'r', encoding='utf-8') as f:
+        return [r['text'] for r in json.load(f)]
+
+
+class TestCompiledBM25(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = BM25Encoder()
+        cls.reference.load(str(FIXTURE / 'bm25_params.json'))
+        cls.compiled = compile_bm25(FIXTURE / 'bm25_params.json', write=False)
+        cls.queries = [q['query'] for q in load_queries()] + ["", "kata-yang-tidak-ada xyz", "AYAM Ayam ayam"]
+        cls.documents = load_texts()[:100] + [""]
+
+    def assertSameSparse(self, got, expected):
+        self.assertEqual(len(got), len(expected))
+        for g, e in zip(got, expected):
+            self.assertEqual(list(g['indices']), list(e['indices']))
+            np.testing.assert_allclose(g['values'], e['values'], rtol=1e-6, atol=1e-9)
+
+    def test_encode_queries(self):
+        self.assertSameSparse(self.compiled.encode_queries(self.queries),
+                              self.reference.encode_queries(self.queries))
+
+    def test_encode_documents(self):
+        self.assertSameSparse(self.compiled.encode_documents(self.documents),
+                              self.reference.encode_documents(self.documents))
+
+    def test_single_text(self):
+        text = self.queries[0]
+        self.assertSameSparse([self.compiled.encode_queries(text)], [self.reference.encode_queries(text)])
+        self.assertSameSparse([self.compiled.encode_documents(text)], [self.reference.encode_documents(text)])
+
+    def test_load_uses_compiled_artifact(self):
+        encoder = load_bm25_encoder(FIXTURE / 'bm25_params.json', strict=True)
+        self.assertIsInstance(encoder, CompiledBM25)
+        self.assertSameSparse(encoder.encode_queries(self.queries), self.reference.encode_queries(self.queries))
+
+
+class TestLocalVectorIndex(unittest.TestCase):
+    def test_sparse_query_without_postings(self):
+        index = LocalVectorIndex(Path(tempfile.mkdtemp()) / 'index')
+        index.upsert_sparse([{"id": "a", "sparse_values": {"indices": [], "values": []}}], "ns")
+        index.save()
+        self.assertEqual(index.query_sparse("ns", {"indices": [1, 2], "values": [0.5, 0.5]}, 10), [])
+
+
+class TestRAGPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.recorded = load_queries()[:8]
+
+    def context(self, q):
+        return QueryContext(q['query'], META['dim'], dense=q['dense'], sparse=q['sparse'])
+
+    def assertSameResults(self, got, expected):
+        self.assertEqual([r['id'] for r in got], [r['id'] for r in expected])
+        for g, e in zip(got, expected):
+            self.assertEqual(g.get('title'), e.get('title'))
+            self.assertEqual(g.get('ingredients'), e.get('ingredients'))
+            self.assertAlmostEqual(g['similarity'], e['similarity'], places=5)
+            for field in ('values', 'vector_all', 'final_vector'):
+                self.assertEqual(field in g, field in e, field)
+                if g.get(field) is not None or e.get(field) is not None:
+                    np.testing.assert_allclose(g[field], e[field], rtol=1e-5, atol=1e-6)
+
+    def test_sync_async_same_results(self):
+        for mode in rp.RETRIEVAL_MODES:
+            for q in self.recorded:
+                expected = rp.RAG_pipeline(q['query'], self.context(q), mode)
+                got = asyncio.run(rp.RAG_pipeline_async(q['query'], self.context(q), mode))
+                self.assertTrue(expected, (mode, q['query']))
+                self.assertSameResults(got, expected)
+
+    def test_batch_async_same_results(self):
+        queries = [q['query'] for q in self.recorded]
+        dense = {q['query']: q['dense'] for q in self.recorded}
+
+        async def fake_embed(texts, dim):
+            return [dense[t] for t in texts]
+
+        with mock.patch.object(rp, 'get_dense_embeddings_batch_async', fake_embed):
+            for mode in rp.RETRIEVAL_MODES:
+                batch = asyncio.run(rp.RAG_pipeline_batch_async(queries, mode))
+                for q, (results, error) in zip(self.recorded, batch):
+                    self.assertIsNone(error)
+                    self.assertSameResults(results, rp.RAG_pipeline(q['query'], self.context(q), mode))
+
+    def test_cached_results_are_copies(self):
+        q = self.recorded[0]
+        with mock.patch.object(rp, 'query_cache', QueryCache(version_fn=lambda: 0)):
+            first = rp.RAG_pipeline(q['query'], self.context(q))
+            expected = [dict(r, ingredients=list(r.get('ingredients') or [])) for r in first]
+            # caller mengubah hasil: entry cache tidak boleh ikut berubah
+            for r in first:
+                r['title'] = None
+                if r.get('ingredients'):
+                    r['ingredients'].append("x")
+            second = rp.RAG_pipeline(q['query'], self.context(q))
+            async_hit = asyncio.run(rp.RAG_pipeline_async(q['query'], self.context(q)))
+        self.assertSameResults(second, expected)
+        self.assertSameResults(async_hit, expected)
+
+
+class TestGuiSequence(unittest.TestCase):
+    ''' Urutan yang dipakai gui.generate_recipe, dengan dan tanpa NAMESPACE_FINAL.'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.recorded = load_queries()[:8]
+
+    def final_namespace(self):
+        return mock.patch.multiple(rp, NAMESPACE_FINAL=META['namespace_final'],
+                                   HYDRATE_NAMESPACE=META['namespace_final'], HYDRATE_KEY='final_vector')
+
+    def session(self, q, progressive=False):
+        data_handler = Datahandle()
+        ctx = QueryContext(q['query'], META['dim'], dense=q['dense'], sparse=q['sparse'])
+        algorithm = AlgorithmClass()
+        algorithm.mapping_input(q['query'], q['dense'])
+        first = None
+        if progressive:
+            candidates = data_handler.attach_vectors(data_handler.retrieve_candidates(q['query'], ctx))
+            first = algorithm.first_pick(candidates)
+            recipes = data_handler.hydrate_candidates_async(candidates).result()
+        else:
+            recipes = data_handler.get_recipes(q['query'], ctx)
+        self.assertTrue(recipes)
+        embeddings_all, embedings_ingredients = data_handler.get_embeddings_recipe(recipes)
+        algorithm.mapping_output(recipes, embeddings_all, embedings_ingredients)
+        titles = [algorithm.first_generate_recipe(first)['title']]
+        for rating in [-1, 1, 5, 3, -5]:
+            titles.append(algorithm.rating_recipe(rating)['title'])
+        return titles
+
+    def test_final_namespace_same_recommendations(self):
+        for q in self.recorded:
+            expected = self.session(q)
+            with self.final_namespace():
+                self.assertEqual(self.session(q), expected, q['query'])
+                self.assertEqual(self.session(q, progressive=True), expected, q['query'])
+
+    def test_missing_final_namespace_falls_back_loudly(self):
+        q = self.recorded[0]
+        expected = self.session(q)
+        out = io.StringIO()
+        with mock.patch.multiple(rp, NAMESPACE_FINAL='final-not-built', HYDRATE_NAMESPACE='final-not-built',
+                                 HYDRATE_KEY='final_vector'), contextlib.redirect_stdout(out):
+            self.assertEqual(self.session(q), expected)
+        self.assertIn("missing from final-not-built", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()